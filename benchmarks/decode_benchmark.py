@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 10:02:37 2026
+
+Decoder throughput benchmark
+
+Run from the repository root:
+    python -m benchmarks.decode_benchmark --chipversion 2 --hits 100000 --gap 64
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from modules.decode import Decode, DecodeStream, SCAN_STRATEGIES
+from benchmarks.stream_generator import generate_stream
+
+
+def timeit(func, repeat: int) -> tuple:
+    """
+    Run function repeatedly
+
+    :param func: Function without arguments
+    :param repeat: Number of runs
+
+    :returns: Best runtime in s, result of the last run
+    """
+
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+def report(name: str, seconds: float, nbytes: int, nhits: int) -> None:
+    print(f"{name:<40} {seconds * 1e3:10.2f} ms {nbytes / seconds / 1e6:10.1f} MB/s {nhits / seconds / 1e6:10.2f} MHits/s")
+
+
+def check(name: str, decoded: np.ndarray, expected: np.ndarray) -> bool:
+    """
+    Compare decoded hits with generator ground truth
+
+    :returns: True if all fields match
+    """
+
+    if len(decoded) != len(expected):
+        print(f"{name}: found {len(decoded)} hits, expected {len(expected)}")
+        return False
+
+    for field in expected.dtype.names:
+        if not np.array_equal(np.asarray(decoded[field], dtype=np.int64), expected[field].astype(np.int64)):
+            print(f"{name}: mismatch in field {field}")
+            return False
+
+    return True
+
+
+def main(args) -> int:
+
+    stream, expected = generate_stream(args.hits, args.chipversion, nchips=args.nchips,
+                                       mean_gap=args.gap, seed=args.seed)
+
+    nbytes = len(stream)
+    nhits = len(expected)
+    ok = True
+
+    print(f"AstroPix{args.chipversion}: {nhits} hits in {nbytes} bytes, {args.nchips} chip(s)\n")
+
+    for scan in SCAN_STRATEGIES:
+        decode = Decode(nchips=args.nchips, bytesperhit=8 if args.chipversion >= 4 else 5, scan=scan)
+
+        seconds, list_hits = timeit(lambda: decode.hits_from_readoutstream(stream), args.repeat)
+        report(f"hits_from_readoutstream ({scan})", seconds, nbytes, nhits)
+
+        seconds, frames = timeit(lambda: decode.hits_from_readoutstream(stream, packed=True), args.repeat)
+        report(f"hits_from_readoutstream packed ({scan})", seconds, nbytes, nhits)
+
+        ok &= len(list_hits) == nhits
+
+    if args.chipversion >= 4:
+        decode_hits, decode_frames = decode.decode_astropix4_hits, decode.decode_astropix4_frames
+    else:
+        decode_hits, decode_frames = decode.decode_astropix2_hits, decode.decode_astropix2_frames
+
+    seconds, decoded = timeit(lambda: decode_hits(list_hits), args.repeat)
+    report(f"{decode_hits.__name__} (list)", seconds, nbytes, nhits)
+    ok &= check(decode_hits.__name__, decoded, expected)
+
+    seconds, decoded = timeit(lambda: decode_frames(frames), args.repeat)
+    report(f"{decode_frames.__name__}", seconds, nbytes, nhits)
+    ok &= check(decode_frames.__name__, decoded, expected)
+
+    chunks = [stream[i:i + args.chunksize] for i in range(0, nbytes, args.chunksize)]
+
+    def stream_decode():
+        decodestream = DecodeStream(decode, validate=True)
+        return np.concatenate([np.empty((0, decode.bytesperhit), dtype=np.uint8)] + list(decodestream.iter_frames(chunks)))
+
+    seconds, frames = timeit(stream_decode, args.repeat)
+    report(f"DecodeStream validate ({args.chunksize} B chunks)", seconds, nbytes, nhits)
+    ok &= check("DecodeStream", decode_frames(frames), expected)
+
+    print("\nDecoded hits match generator" if ok else "\nFAILED: Decoded hits do not match generator")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Decoder throughput benchmark')
+    parser.add_argument('--chipversion', type=int, default=2, help='2/3: 5byte frames, 4: 8byte frames')
+    parser.add_argument('--hits', type=int, default=100000, help='Number of hits')
+    parser.add_argument('--gap', type=float, default=64, help='Mean number of idle bytes between hits')
+    parser.add_argument('--nchips', type=int, default=1, help='Number of chips')
+    parser.add_argument('--chunksize', type=int, default=4096, help='Chunk size for DecodeStream')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions, best time is reported')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 13:05:19 2026
+
+Pattern generation micro-benchmark
+
+Compares clockdivider expansion and pattern generation against the former
+byte-wise implementation for realistic config sizes. Generated patterns are
+checked to be byte-identical to the former implementation for several clock
+dividers, readback mode and vectors split into multiple parts.
+
+Run from the repository root:
+    python -m benchmarks.pattern_benchmark
+"""
+import argparse
+import sys
+import time
+
+from bitstring import BitArray
+
+from modules.nexysio import Nexysio, WRITE_ADRESS, SR_ASIC_ADRESS, SIN_ASIC, LD_ASIC, LD_TDAC_ASIC, \
+    SIN_GECCO, LD_GECCO
+
+
+def addbytes_reference(value: bytearray, clkdiv: int) -> bytearray:
+    """Former Nexysio.__addbytes(), repeats each byte in a Python loop"""
+
+    data = bytearray()
+
+    clkdiv = max(clkdiv, 1)
+
+    for byte in value:
+        data.extend([byte] * clkdiv)
+
+    return data
+
+
+def gecco_pattern_reference(address: int, value: BitArray, clkdiv: int = 16) -> bytes:
+    """Former Nexysio.gen_gecco_pattern(), builds the waveform bit by bit"""
+
+    length = (len(value) * 3 + 20) * clkdiv
+
+    header = bytearray([WRITE_ADRESS, address, length >> 8, length % 256])
+
+    data = bytearray()
+
+    for bit in value:
+        pattern = SIN_GECCO if bit == 1 else 0
+
+        data.extend([pattern, pattern | 1, pattern])
+
+    data.extend([LD_GECCO, 0x00])
+    data.extend([0x01, 0x00] * 8)
+    data.extend([LD_GECCO, 0x00])
+
+    return b''.join([header, addbytes_reference(data, clkdiv)])
+
+
+def asic_pattern_part_reference(value: BitArray, wload: bool, clkdiv: int = 8,
+                                readback_mode: bool = False, load_signal: int = LD_ASIC) -> bytes:
+    """Former Nexysio.gen_asic_pattern_part() and gen_tdac_pattern() with load_signal LD_TDAC_ASIC
+
+    The former gen_tdac_pattern() has no readback mode, only the header is generated.
+    """
+
+    if not readback_mode:
+        length = (len(value) * 5 + 30) * clkdiv
+    else:
+        length = ((len(value) + 1) * 5) * clkdiv
+
+    header = bytearray([WRITE_ADRESS, SR_ASIC_ADRESS, length >> 8, length % 256])
+
+    data, load = bytearray(), bytearray()
+
+    if not readback_mode:
+        for bit in value:
+            pattern = SIN_ASIC if bit == 1 else 0
+
+            data.extend([pattern, pattern | 1, pattern, pattern | 2, pattern])
+
+        if wload:
+            load.extend([0x00, load_signal, 0x00])
+
+        data = addbytes_reference(data, clkdiv)
+        data.extend(addbytes_reference(load, clkdiv * 10))
+
+    elif load_signal == LD_ASIC:
+        data.extend([4 | 32, 4 | 33, 4 | 32, 4 | 34, 4 | 32])
+        for bit in value:
+            data.extend([4, 4 | 1, 4, 4 | 2, 4])
+        data = addbytes_reference(data, clkdiv)
+
+    return b''.join([header, data])
+
+
+def asic_pattern_reference(value: BitArray, wload: bool, clkdiv: int = 8, readback_mode: bool = False) -> list:
+    """Former Nexysio.gen_asic_pattern(), splits the vector in parts"""
+
+    data = []
+
+    if not readback_mode:
+        max_value = int((65534 / clkdiv - 30) / 5)
+    else:
+        max_value = int((65534 / clkdiv) / 5) - 1
+
+    length = len(value)
+
+    while length >= max_value:
+        data.append(asic_pattern_part_reference(value[:max_value], False, clkdiv, readback_mode))
+        value = value[max_value + 1:]
+        length -= max_value
+    else:
+        data.append(asic_pattern_part_reference(value, wload, clkdiv, readback_mode))
+
+    return data
+
+
+def check_patterns(nexys: Nexysio, asicvector: BitArray, vbvector: BitArray) -> bool:
+    """
+    Compare all pattern generators against the former implementation
+
+    :returns: True if all patterns are byte-identical
+    """
+
+    # Long enough to be split in multiple parts for all clock dividers above 2
+    longvector = BitArray(uint=0x3C96A5F0, length=32) * 200
+
+    ok = True
+
+    for clkdiv in (1, 2, 8, 16):
+        for vector in (asicvector, longvector, asicvector[:7]):
+            for wload in (True, False):
+                for readback_mode in (False, True):
+                    pattern = nexys.gen_asic_pattern(vector, wload, clkdiv, readback_mode)
+                    ok &= pattern == asic_pattern_reference(vector, wload, clkdiv, readback_mode)
+
+                    # Single parts are limited to a 16 bit length header
+                    if (len(vector) * 5 + 30) * clkdiv < 1 << 16:
+                        pattern = nexys.gen_asic_pattern_part(vector, wload, clkdiv, readback_mode)
+                        ok &= pattern == asic_pattern_part_reference(vector, wload, clkdiv, readback_mode)
+
+                    pattern = nexys.gen_tdac_pattern(vector[:80], wload, clkdiv, readback_mode)
+                    ok &= pattern == asic_pattern_part_reference(vector[:80], wload, clkdiv, readback_mode, LD_TDAC_ASIC)
+
+        ok &= nexys.gen_gecco_pattern(12, vbvector, clkdiv) == gecco_pattern_reference(12, vbvector, clkdiv)
+
+    return ok
+
+
+def timeit(func, repeat: int) -> float:
+    """
+    Run function repeatedly
+
+    :returns: Best runtime in s
+    """
+
+    best = float('inf')
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def report(name: str, reference: float, current: float) -> None:
+    print(f"{name:<36} {reference * 1e6:10.1f} us {current * 1e6:10.1f} us {reference / current:8.1f}x")
+
+
+def main(args) -> int:
+
+    nexys = Nexysio()
+    addbytes = nexys._Nexysio__addbytes
+
+    # ~850 bit AstroPix4 config with 5 byte waveform per bit, 136 bit voltageboard vector
+    sizes = {'ASIC config': 5 * args.asic_bits, 'Voltageboard': 3 * 136 + 20}
+
+    print(f"{'':<36} {'reference':>13} {'current':>13} {'speedup':>9}")
+
+    ok = True
+
+    for name, size in sizes.items():
+        value = bytearray((i * 7) & 0x07 for i in range(size))
+
+        ok &= addbytes(value, args.clkdiv) == addbytes_reference(value, args.clkdiv)
+
+        report(f"__addbytes {name} ({size} B)",
+               timeit(lambda: addbytes_reference(value, args.clkdiv), args.repeat),
+               timeit(lambda: addbytes(value, args.clkdiv), args.repeat))
+
+    asicvector = BitArray(uint=0x5A5A5A5A, length=32) * (args.asic_bits // 32)
+    vbvector = BitArray(uint=0xA5A5, length=16) * 8 + BitArray(uint=0x10, length=8)
+
+    tdacvector = asicvector[:args.tdac_bits]
+
+    patterns = {
+        f'gen_asic_pattern ({len(asicvector)} bit)': (
+            lambda: asic_pattern_reference(asicvector, True), lambda: nexys.gen_asic_pattern(asicvector, True)),
+        f'gen_tdac_pattern ({args.tdac_bits} bit)': (
+            lambda: asic_pattern_part_reference(tdacvector, True, load_signal=LD_TDAC_ASIC),
+            lambda: nexys.gen_tdac_pattern(tdacvector, True)),
+        f'gen_gecco_pattern ({len(vbvector)} bit)': (
+            lambda: gecco_pattern_reference(12, vbvector, 8), lambda: nexys.gen_gecco_pattern(12, vbvector, 8)),
+    }
+
+    print()
+
+    for name, (reference, current) in patterns.items():
+        report(name, timeit(reference, args.repeat), timeit(current, args.repeat))
+
+    ok &= check_patterns(nexys, asicvector, vbvector)
+
+    print("\nPatterns match reference" if ok else "\nFAILED: Patterns do not match reference")
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pattern generation micro-benchmark')
+    parser.add_argument('--asic-bits', type=int, default=864, help='Length of ASIC config vector')
+    parser.add_argument('--tdac-bits', type=int, default=80, help='Length of TDAC row vector')
+    parser.add_argument('--clkdiv', type=int, default=8, help='Clockdivider')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetitions, best time is reported')
+
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 09:41:12 2026
+
+Synthetic SPI readout streams with known content for decoder tests and benchmarks
+"""
+import numpy as np
+
+from modules.decode import ASTROPIX2_HIT_DTYPE, ASTROPIX4_HIT_DTYPE
+from modules.spi import REVERSE_BITORDER_TABLE
+
+
+def _astropix2_frames(rng: np.random.Generator, ids: np.ndarray, num_cols: int, num_rows: int) -> tuple:
+    """
+    Generate random 5byte AstroPix2 frames
+
+    :returns: Frame array, structured array with expected hits
+    """
+
+    nhits = ids.size
+    hits = np.zeros(nhits, dtype=ASTROPIX2_HIT_DTYPE)
+
+    hits['id']          = ids
+    hits['payload']     = 4
+    hits['col']         = rng.integers(0, 2, nhits)
+    hits['location']    = rng.integers(0, np.where(hits['col'], num_cols, num_rows))
+    hits['timestamp']   = rng.integers(0, 256, nhits)
+    hits['tot_total']   = rng.integers(0, 4096, nhits)
+
+    frames = np.empty((nhits, 5), dtype=np.uint8)
+
+    frames[:, 0] = (hits['id'] << 3) | hits['payload']
+    frames[:, 1] = (hits['col'] << 7) | hits['location']
+    frames[:, 2] = hits['timestamp']
+    frames[:, 3] = hits['tot_total'] >> 8
+    frames[:, 4] = hits['tot_total'] & 0xFF
+
+    return frames, hits
+
+
+def _astropix4_frames(rng: np.random.Generator, ids: np.ndarray, num_cols: int, num_rows: int) -> tuple:
+    """
+    Generate random 8byte AstroPix4 frames
+
+    :returns: Frame array, structured array with expected hits
+    """
+
+    nhits = ids.size
+    hits = np.zeros(nhits, dtype=ASTROPIX4_HIT_DTYPE)
+
+    hits['id']          = ids
+    hits['payload']     = 7
+    # Row and col are 5bit wide in the frame
+    hits['row']         = rng.integers(0, min(num_rows, 32), nhits)
+    hits['col']         = rng.integers(0, min(num_cols, 32), nhits)
+
+    for i in (1, 2):
+        hits[f'ts{i}']      = rng.integers(0, 1 << 14, nhits)
+        hits[f'tsfine{i}']  = rng.integers(0, 8, nhits)
+        hits[f'tsneg{i}']   = rng.integers(0, 2, nhits)
+        hits[f'tstdc{i}']   = rng.integers(0, 32, nhits)
+
+        # Reference Gray decoding, bit by bit
+        gray = (hits[f'ts{i}'].astype(np.uint32) << 3) | hits[f'tsfine{i}']
+        dec = gray.copy()
+        for shift in range(1, 17):
+            dec ^= gray >> shift
+        hits[f'ts_dec{i}'] = dec
+
+    ts1 = hits['ts1'].astype(np.uint32)
+    ts2 = hits['ts2'].astype(np.uint32)
+
+    frames = np.empty((nhits, 8), dtype=np.uint8)
+
+    frames[:, 0] = (hits['id'] << 3) | hits['payload']
+    frames[:, 1] = (hits['row'] << 3) | (hits['col'] >> 2)
+    frames[:, 2] = ((hits['col'] & 0b11) << 6) | (hits['tsneg1'] << 5) | (ts1 >> 9)
+    frames[:, 3] = (ts1 >> 1) & 0xFF
+    frames[:, 4] = ((ts1 & 1) << 7) | (hits['tsfine1'] << 4) | (hits['tstdc1'] >> 1)
+    frames[:, 5] = ((hits['tstdc1'] & 1) << 7) | (hits['tsneg2'] << 6) | (ts2 >> 8)
+    frames[:, 6] = ts2 & 0xFF
+    frames[:, 7] = (hits['tsfine2'] << 5) | hits['tstdc2']
+
+    return frames, hits
+
+
+def generate_stream(nhits: int, chipversion: int = 2, **kwargs) -> tuple:
+    """
+    Generate SPI readout stream with random hits between idle bytes
+
+    :param nhits: Number of hits
+    :param chipversion: 2/3 for 5byte frames, 4 for 8byte frames
+    :param nchips: Number of chips, hits get random chip ids
+    :param mean_gap: Mean number of idle bytes between two hits
+    :param idle_byte: Value of idle bytes, must not be a header value
+    :param reverse_bitorder: Reverse bitorder of each byte as on the SPI bus
+    :param num_cols: Number of columns
+    :param num_rows: Number of rows
+    :param seed: Seed for the random generator
+
+    :returns: Readout stream, structured array with expected hits
+    """
+
+    nchips = kwargs.get('nchips', 1)
+    mean_gap = kwargs.get('mean_gap', 64)
+    idle_byte = kwargs.get('idle_byte', 0xFF)
+    reverse_bitorder = kwargs.get('reverse_bitorder', True)
+    num_cols = kwargs.get('num_cols', 35)
+    num_rows = kwargs.get('num_rows', 35)
+
+    rng = np.random.default_rng(kwargs.get('seed'))
+
+    ids = rng.integers(0, nchips, nhits).astype(np.uint8)
+
+    if chipversion >= 4:
+        frames, hits = _astropix4_frames(rng, ids, num_cols, num_rows)
+    else:
+        frames, hits = _astropix2_frames(rng, ids, num_cols, num_rows)
+
+    bytesperhit = frames.shape[1]
+
+    if idle_byte in [(chip << 3) + bytesperhit - 1 for chip in range(nchips)]:
+        raise ValueError(f"Idle byte {idle_byte:#04x} is a header value")
+
+    # Idle gaps before each hit and after the last one
+    gaps = rng.poisson(mean_gap, nhits + 1)
+    offsets = np.cumsum(gaps[:-1]) + np.arange(nhits) * bytesperhit
+
+    stream = np.full(gaps.sum() + nhits * bytesperhit, idle_byte, dtype=np.uint8)
+    stream[offsets[:, None] + np.arange(bytesperhit)] = frames
+
+    stream = bytearray(stream.tobytes())
+
+    if reverse_bitorder:
+        stream = stream.translate(REVERSE_BITORDER_TABLE)
+
+    return stream, hits
@@ -9,7 +9,7 @@ from modules.asic import Asic
 from modules.injectionboard import Injectionboard
 from modules.nexysio import Nexysio
 from modules.voltageboard import Voltageboard
-from modules.decode import Decode
+from modules.decode import Decode, DecodeStream
 from utils.utils import wait_progress
 
 
@@ -98,14 +98,18 @@ def main():
     inj.start()
 
     wait_progress(3)
+
+    # Frames crossing read boundaries are completed with the next read
+    decode = Decode(bytesperhit=8)
+    stream = DecodeStream(decode)
+
     while True:
         # Read max. 100 times or until read FIFO is empty
         readout = nexys.read_spi(100)
 
-        decode = Decode(bytesperhit=8)
-        list_hits = decode.hits_from_readoutstream(readout)
+        frames = stream.feed(readout)
 
-        print(decode.decode_astropix4_hits(list_hits).to_string())
+        print(decode.decode_astropix4_hits(frames).to_string())
 
 
 if __name__ == "__main__":
@@ -7,11 +7,17 @@ Created on Fri Jun 25 16:28:27 2021
 
 Functions for ASIC configuration
 """
+import hashlib
 import logging
+import numpy as np
 import yaml
 from bitstring import BitArray
 
-from modules.nexysio import Nexysio
+from modules.configcache import dump_yaml, dumps_snapshot, load_yaml, loads_snapshot
+from modules.configlayout import ConfigLayout
+from modules.nexysio import Nexysio, waveform_table, ASIC_CLOCKS, SIN_ASIC, USB_FRAME_SIZE
+from modules.patterncache import PatternCache
+from modules.pixelmask import PixelMask
 from modules.setup_logger import logger
 
 
@@ -28,7 +34,7 @@ class Asic(Nexysio):
 
     def __init__(self, handle) -> None:
 
-        self._handle = handle
+        super().__init__(handle)
 
         self._chipversion = None
 
@@ -42,6 +48,84 @@ class Asic(Nexysio):
 
         self._chipname = ""
 
+        self._pattern_cache = PatternCache()
+
+        self._layout = None
+
+        # ASIC waveform of the config vector with one row per bit, updated for dirty fields only
+        self._waveform = None
+        self._waveform_clkdiv = None
+
+    @property
+    def pattern_cache(self) -> PatternCache:
+        """Cache of generated ASIC patterns, see stats for hit/miss statistics
+
+        :returns: PatternCache
+        """
+        return self._pattern_cache
+
+    @property
+    def layout(self) -> ConfigLayout:
+        """Compiled bit layout of the config vector, built at load_conf_from_yaml
+
+        :returns: ConfigLayout
+        """
+        if self._layout is None or not self._layout.matches(self.__layout_configs()):
+            self.compile_layout()
+
+        return self._layout
+
+    def compile_layout(self) -> None:
+        """Compile bit layout of the config vector from asic_config"""
+
+        self._layout = ConfigLayout(self.__layout_configs(), reverse_keys=() if self.num_chips > 1 else ('vdacs',))
+        self._waveform = None
+
+        logger.debug("Compiled config layout with %d fields and %d bits", len(self._layout.fields), len(self._layout))
+
+    @property
+    def dirty_fields(self) -> list:
+        """Config fields changed since the last write, i.e. ('recconfig', 'col3')
+
+        Telescope fields are prefixed with the chip number.
+
+        :returns: List of tuples
+        """
+        layout = self.layout
+
+        layout.update(self.__layout_configs())
+
+        return [
+            (field.key, field.name) if field.chip is None else (field.chip, field.key, field.name)
+            for field in (layout.fields[index] for index in layout.dirty)
+        ]
+
+    def __set_field(self, key: str, name: str, value: int) -> None:
+        """Set single chip config field and mark it dirty
+
+        :param key: Config key, i.e. 'recconfig'
+        :param name: Field name, i.e. 'col3'
+        :param value: Field value
+        """
+        self.asic_config[key][name][1] = value
+
+        if self._layout is not None:
+            try:
+                self._layout.set_value(self._layout.index(key, name), value)
+            except KeyError:
+                # Structure changed, layout is recompiled on next use
+                pass
+
+    def __layout_configs(self) -> list:
+        """Config dicts in shift order
+
+        :returns: List of (chip, config dict)
+        """
+        if self.num_chips > 1:
+            return [(chip, self.asic_config[f'config_{chip}']) for chip in range(self.num_chips - 1, -1, -1)]
+
+        return [(None, self.asic_config)]
+
     @property
     def chipname(self):
         """Get/set chipname
@@ -147,10 +231,12 @@ class Asic(Nexysio):
 
         :param col: Col number
         """
+        recconfig = self.asic_config['recconfig']
+
         for i in range(self.num_cols):
-            self.asic_config['recconfig'][f'col{i}'][1] &= COLCONFIG_MASK_AMP
+            self.__set_field('recconfig', f'col{i}', recconfig[f'col{i}'][1] & COLCONFIG_MASK_AMP)
 
-        self.asic_config['recconfig'][f'col{col}'][1] |= 1 << 37
+        self.__set_field('recconfig', f'col{col}', recconfig[f'col{col}'][1] | 1 << 37)
 
     def enable_pixel(self, col: int, row: int):
         """Enable pixel comparator for specified pixel
@@ -178,10 +264,12 @@ class Asic(Nexysio):
         :param enable: True to enable, False to disable
         """
         if row < self.num_rows and col < self.num_cols:
+            value = self.asic_config['recconfig'][f'col{col}'][1]
+
             if enable:
-                self.asic_config['recconfig'][f'col{col}'][1] &= ~(2 << row)
+                self.__set_field('recconfig', f'col{col}', value & ~(2 << row))
             else:
-                self.asic_config['recconfig'][f'col{col}'][1] |= (2 << row)
+                self.__set_field('recconfig', f'col{col}', value | (2 << row))
 
     def set_inj_row(self, row: int, enable: bool):
         """Enable or disable row injection switch
@@ -190,10 +278,12 @@ class Asic(Nexysio):
         :param enable: True to enable, False to disable
         """
         if row < self.num_rows:
+            value = self.asic_config['recconfig'][f'col{row}'][1]
+
             if enable:
-                self.asic_config['recconfig'][f'col{row}'][1] |= 1 << 0
+                self.__set_field('recconfig', f'col{row}', value | 1 << 0)
             else:
-                self.asic_config['recconfig'][f'col{row}'][1] &= COLCONFIG_MASK_ROW
+                self.__set_field('recconfig', f'col{row}', value & COLCONFIG_MASK_ROW)
 
     def set_inj_col(self, col: int, enable: bool):
         """Enable or disable col injection switch
@@ -202,10 +292,12 @@ class Asic(Nexysio):
         :param enable: True to enable, False to disable
         """
         if col < self.num_cols:
+            value = self.asic_config['recconfig'][f'col{col}'][1]
+
             if enable:
-                self.asic_config['recconfig'][f'col{col}'][1] |= 1 << 36
+                self.__set_field('recconfig', f'col{col}', value | 1 << 36)
             else:
-                self.asic_config['recconfig'][f'col{col}'][1] &= COLCONFIG_MASK_COL
+                self.__set_field('recconfig', f'col{col}', value & COLCONFIG_MASK_COL)
 
     def get_pixel(self, col: int, row: int) -> bool:
         """Check if Pixel is enabled
@@ -219,10 +311,29 @@ class Asic(Nexysio):
         logger.error("Invalid row %d larger than %d", row, self.num_rows)
         return None
 
+    def get_pixel_mask(self) -> PixelMask:
+        """Get pixel comparators, injection and ampout switches as matrix
+
+        :returns: PixelMask
+        """
+        return PixelMask.from_recconfig(self.asic_config['recconfig'], self.num_rows)
+
+    def set_pixel_mask(self, mask: PixelMask) -> None:
+        """Pack pixel mask into recconfig, only changed cols are marked dirty
+
+        :param mask: PixelMask with num_cols x num_rows pixels
+        """
+        if mask.shape != (self.num_cols, self.num_rows):
+            logger.error("Pixel mask shape %s does not match %dx%d", mask.shape, self.num_cols, self.num_rows)
+            raise ValueError("Pixel mask shape mismatch")
+
+        for col, word in enumerate(mask.to_words()):
+            self.__set_field('recconfig', f'col{col}', int(word))
+
     def reset_recconfig(self):
         """Reset recconfig to default mask"""
         for key in self.asic_config['recconfig']:
-            self.asic_config['recconfig'][key][1] = COLCONFIG_MASK_ALL
+            self.__set_field('recconfig', key, COLCONFIG_MASK_ALL)
 
     def set_internal_vdac(self, dac: str, voltage: float, vdda: float = 1.8, nbits: int = 10) -> None:
         """Set integrated VDAC voltage
@@ -258,20 +369,22 @@ class Asic(Nexysio):
     def load_conf_from_yaml(self, chipversion: int, filename: str, **kwargs) -> None:
         """Load ASIC config from yaml
 
+        The parsed config is cached next to the yml file and reused until the file changes.
+
         :param chipversion: Name of yml file in config folder
         :param filename: Name of yml file in config folder
         :param chipname; Name of the chip i.e. astropix
+        :param use_cache: Use compiled config cache, default True
         """
         chipname = kwargs.get('chipname', 'astropix')
 
         self.chipversion = chipversion
         self.chipname = chipname
 
-        with open(f"config/{filename}.yml", "r", encoding="utf-8") as stream:
-            try:
-                dict_from_yml = yaml.safe_load(stream)
-            except yaml.YAMLError as exc:
-                logger.error(exc)
+        try:
+            dict_from_yml = load_yaml(f"config/{filename}.yml", kwargs.get('use_cache', True))
+        except yaml.YAMLError as exc:
+            logger.error(exc)
 
         # Get Telescope settings
         try:
@@ -325,6 +438,8 @@ class Asic(Nexysio):
                 logger.error("%s%d tdac config not found!", chipname, chipversion)
                 raise
 
+        self.compile_layout()
+
     def write_conf_to_yaml(self, filename: str) -> None:
         """Write ASIC config to yaml
 
@@ -346,45 +461,60 @@ class Asic(Nexysio):
 
         with open(f"config/{filename}.yml", "w", encoding="utf-8") as stream:
             try:
-                yaml.dump(dicttofile, stream, default_flow_style=False, sort_keys=False)
+                dump_yaml(dicttofile, stream)
 
             except yaml.YAMLError as exc:
                 logger.error(exc)
 
+    def snapshot(self) -> bytes:
+        """Get compact binary snapshot of ASIC and TDAC config, i.e. for each scan step
+
+        :returns: Snapshot bytes, restore with load_snapshot()
+        """
+        return dumps_snapshot({
+            "chipname": self.chipname,
+            "chipversion": self.chipversion,
+            "telescope": {"nchips": self.num_chips},
+            "geometry": {"cols": self.num_cols, "rows": self.num_rows},
+            "config": self.asic_config,
+            "tdac_config": self.asic_tdac_config
+        })
+
+    def load_snapshot(self, snapshot: bytes) -> None:
+        """Restore ASIC and TDAC config from binary snapshot
+
+        :param snapshot: Snapshot bytes from snapshot()
+        """
+        config = loads_snapshot(snapshot)
+
+        self.chipname = config['chipname']
+        self.chipversion = config['chipversion']
+        self.num_chips = config['telescope']['nchips']
+        self.num_cols = config['geometry']['cols']
+        self.num_rows = config['geometry']['rows']
+
+        self.asic_config = config['config']
+        self.asic_tdac_config = config['tdac_config']
+
+        self.compile_layout()
+
     def gen_asic_vector(self, msbfirst: bool = False) -> BitArray:
         """Generate asic bitvector from digital, bias and dacconfig
 
+        Only fields changed since the last call are rewritten in the compiled layout.
+
         :param msbfirst: Send vector MSB first
         """
 
-        bitvector = BitArray()
+        layout = self.layout
+
+        layout.update(self.__layout_configs())
 
         if self.num_chips > 1:
             for chip in range(self.num_chips - 1, -1, -1):
-
-                for key in self.asic_config[f'config_{chip}']:
-                    for values in self.asic_config[f'config_{chip}'][key].values():
-                        bitvector.append(self.__int2nbit(values[1], values[0]))
-
-                if not msbfirst:
-                    bitvector.reverse()
-
                 logger.info("Generated chip_%d config successfully!", chip)
 
-        else:
-            for key in self.asic_config:
-                for values in self.asic_config[key].values():
-                    if key == 'vdacs':
-                        bitvector2 = BitArray(self.__int2nbit(values[1], values[0]))
-                        bitvector2.reverse()
-                        bitvector.append(bitvector2)
-                    else:
-                        bitvector.append(self.__int2nbit(values[1], values[0]))
-
-            if not msbfirst:
-                bitvector.reverse()
-
-        return bitvector
+        return layout.vector(msbfirst)
 
     def gen_asic_row_vector(self, row: int, msbfirst: bool = False, ) -> BitArray:
         """Generate asic tdac bitvector
@@ -413,26 +543,195 @@ class Asic(Nexysio):
 
         return bitvector
 
-    def update_asic(self) -> None:
-        """Update ASIC"""
+    def update_asic(self, force: bool = False) -> None:
+        """Update ASIC, skipped if the config is unchanged since the last write
+
+        :param force: Write config even if unchanged
+        """
+
+        vector = self.gen_asic_vector()
+        digest = self.config_digest(vector)
+
+        if not self.config_changed('asic', digest, force):
+            return
+
+        written = True
 
         if self.chipversion == 1:
             dummybits = self.gen_asic_pattern(BitArray(uint=0, length=245), True)  # Not needed for v2
-            self.write(dummybits)
+            written = self.write(dummybits)
 
         # Write config
-        asicbits = self.gen_asic_pattern(self.gen_asic_vector(), True)
+        self.__update_waveform()
+
+        asicbits = self.__cached_pattern('asic', vector, True)
 
         for value in asicbits:
-            self.write(value)
+            written &= self.write(value)
+
+        if written:
+            self.config_written('asic', digest)
+
+    def __update_waveform(self, clkdiv: int = 8) -> np.ndarray:
+        """Update ASIC waveform of the config vector, only bits of dirty fields are rewritten
+
+        :param clkdiv: Clockdivider
+
+        :returns: Waveform with one row per bit of the LSB first config vector
+        """
+        layout = self.layout
+        table = waveform_table(SIN_ASIC, ASIC_CLOCKS, clkdiv)
+
+        if self._waveform is None or self._waveform_clkdiv != clkdiv:
+            self._waveform = table[layout.bits()]
+            self._waveform_clkdiv = clkdiv
+        else:
+            positions = layout.positions(layout.dirty)
+            self._waveform[positions] = table[layout.bits(positions=positions)]
 
-    def update_asic_tdacrow(self, row: int) -> None:
-        """Write ASIC TDAC ROW
+        layout.clear_dirty()
+
+        return self._waveform
+
+    def update_asic_tdacrow(self, row: int, force: bool = False) -> None:
+        """Write ASIC TDAC ROW, skipped if the row config is unchanged since the last write
         :param row: Specify row to write tdac config
+        :param force: Write config even if unchanged
         """
-        asicbits = self.gen_tdac_pattern(self.gen_asic_row_vector(row), True)
+        vector = self.gen_asic_row_vector(row)
+        digest = self.config_digest(vector)
 
-        self.write(asicbits)
+        if not self.config_changed(f'tdac_row{row}', digest, force):
+            return
+
+        asicbits, = self.__cached_pattern('tdac', vector, True)
+
+        if self.write(asicbits):
+            self.config_written(f'tdac_row{row}', digest)
+
+    def __tdac_layout(self) -> tuple:
+        """Get TDAC row width and bits per pixel
+
+        Each row word holds the TDAC values of all cols, col 0 in the least significant bits.
+        Only single chip tdac configs are supported.
+
+        :returns: Tuple with row width and bits per pixel
+        """
+        if self.num_chips > 1:
+            logger.error("Bulk TDAC access is only supported for single chips, %d chips configured", self.num_chips)
+            raise ValueError("Bulk TDAC access of telescopes")
+
+        width = self.asic_tdac_config['row0'][0]
+
+        if width % self.num_cols:
+            logger.error("TDAC row width %d is not a multiple of %d cols", width, self.num_cols)
+            raise ValueError("Invalid TDAC row width")
+
+        return width, width // self.num_cols
+
+    def get_tdac_matrix(self) -> np.ndarray:
+        """Get TDAC values from tdac config
+
+        Only single chip configs are supported, raises ValueError for telescopes.
+
+        :returns: (rows x cols) array
+        """
+        width, nbits = self.__tdac_layout()
+
+        tdacs = np.zeros((len(self.asic_tdac_config), self.num_cols), dtype=np.int64)
+
+        for row in range(len(self.asic_tdac_config)):
+            word = self.asic_tdac_config[f'row{row}'][1]
+            tdacs[row] = [(word >> (col * nbits)) & ((1 << nbits) - 1) for col in range(self.num_cols)]
+
+        return tdacs
+
+    def update_asic_tdac(self, tdacs: np.ndarray = None, force: bool = False, clkdiv: int = 8) -> int:
+        """Write TDAC values of all rows, patterns are streamed in as few USB writes as possible
+
+        Rows unchanged since the last write are skipped.
+        Only single chip configs are supported, raises ValueError for telescopes.
+
+        :param tdacs: (rows x cols) array with TDAC values, None writes the current tdac config
+        :param force: Write rows even if unchanged
+        :param clkdiv: Clockdivider
+
+        :returns: Number of written rows
+        """
+        width, nbits = self.__tdac_layout()
+        nrows = len(self.asic_tdac_config)
+
+        if tdacs is not None:
+            tdacs = np.asarray(tdacs, dtype=np.int64)
+
+            if tdacs.shape != (nrows, self.num_cols):
+                logger.error("TDAC array shape %s does not match %dx%d", tdacs.shape, nrows, self.num_cols)
+                raise ValueError("TDAC array shape mismatch")
+
+            if tdacs.min() < 0 or tdacs.max() >= 1 << nbits:
+                logger.error('Allowed TDAC Values 0 - %d', 2**nbits - 1)
+                raise ValueError("TDAC value out of range")
+        else:
+            tdacs = self.get_tdac_matrix()
+
+        # LSB first row vectors, vector bit col * nbits + n is bit n of col
+        bits = ((tdacs[:, :, np.newaxis] >> np.arange(nbits)) & 1).astype(np.uint8).reshape(nrows, width)
+
+        rows, digests = [], []
+        for row in range(nrows):
+            # Keep tdac config in sync, MSB first packed bits with padding in the LSBs
+            self.asic_tdac_config[f'row{row}'][1] = int.from_bytes(np.packbits(bits[row, ::-1]).tobytes(), 'big') >> (-width % 8)
+
+            digest = self.config_digest(BitArray(bytes=np.packbits(bits[row]).tobytes(), length=width))
+
+            if self.config_changed(f'tdac_row{row}', digest, force):
+                rows.append(row)
+                digests.append(digest)
+
+        if not rows:
+            return 0
+
+        patterns = self.gen_tdac_patterns(bits[rows], True, clkdiv)
+        rows_per_write = max(USB_FRAME_SIZE // patterns.shape[1], 1)
+
+        with self.transaction():
+            written = True
+
+            for start in range(0, len(rows), rows_per_write):
+                written &= self.write(patterns[start:start + rows_per_write].tobytes())
+
+            # Recorded when the transaction was sent successfully
+            if written:
+                for row, digest in zip(rows, digests):
+                    self.config_written(f'tdac_row{row}', digest)
+
+        logger.info("Wrote TDAC config of %d rows", len(rows))
+
+        return len(rows)
+
+    def __cached_pattern(self, kind: str, vector: BitArray, wload: bool, clkdiv: int = 8) -> tuple:
+        """Get ASIC or TDAC pattern from cache or generate it
+
+        :param kind: 'asic' or 'tdac'
+        :param vector: Config bitvector
+        :param wload: Send load signal
+        :param clkdiv: Clockdivider
+
+        :returns: Tuple of bytestrings
+        """
+        key = (kind, hashlib.blake2b(vector.tobytes(), digest_size=16).digest(), len(vector), clkdiv, wload)
+
+        asicbits = self._pattern_cache.get(key)
+
+        if asicbits is None:
+            if kind == 'tdac':
+                asicbits = self.gen_tdac_pattern(vector, wload, clkdiv)
+            else:
+                asicbits = self.gen_asic_pattern(vector, wload, clkdiv, waveform=self.__update_waveform(clkdiv))
+
+            asicbits = self._pattern_cache.put(key, asicbits)
+
+        return asicbits
 
     def readback_asic(self):
         asicbits = self.gen_asic_pattern(self.gen_asic_vector(), True, readback_mode=True)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 18:10:26 2026
+
+Cached loading, fast dumping and binary snapshots of config files
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import struct
+import zlib
+
+import yaml
+
+from modules.setup_logger import logger
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = '.cache'
+CACHE_VERSION = 1
+CACHE_KEYS = frozenset({'mtime_ns', 'size', 'sha256', 'data'})
+
+# C based loader and emitter are much faster, if libyaml is available
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+Dumper = getattr(yaml, 'CDumper', yaml.Dumper)
+
+# Binary snapshot: magic, version, payload length, zlib compressed json
+SNAPSHOT_MAGIC = b'APXC'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('>4sBI')
+
+
+def cache_path(path: str) -> str:
+    """
+    Path of the sidecar cache file
+
+    :param path: Path of yaml file
+
+    :returns: Path of cache file
+    """
+    return path + CACHE_SUFFIX
+
+
+def load_yaml(path: str, use_cache: bool = True):
+    """
+    Load yaml file, from the sidecar cache if it is still valid
+
+    The cache is valid if mtime and size of the yaml file are unchanged or its sha256 matches.
+    Invalid or unreadable caches are rebuilt, failing to write the cache is not an error.
+
+    :param path: Path of yaml file
+    :param use_cache: Read and write sidecar cache
+
+    :returns: Parsed yaml content
+    """
+
+    stat = os.stat(path)
+
+    if not use_cache:
+        with open(path, "rb") as stream:
+            return yaml.load(stream, Loader=SafeLoader)
+
+    cached = _read_cache(path)
+
+    if cached is not None and (cached['mtime_ns'], cached['size']) == (stat.st_mtime_ns, stat.st_size):
+        logger.debug("Loaded %s from cache", path)
+        return cached['data']
+
+    with open(path, "rb") as stream:
+        content = stream.read()
+
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    if cached is not None and cached['sha256'] == sha256:
+        data = cached['data']
+        logger.debug("Loaded %s from cache, file touched", path)
+    else:
+        data = yaml.load(content, Loader=SafeLoader)
+        logger.debug("Parsed %s", path)
+
+    _write_cache(path, {
+        'version': CACHE_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+        'sha256': sha256, 'data': data
+    })
+
+    return data
+
+
+def _read_cache(path: str) -> dict:
+    """
+    Read sidecar cache
+
+    :param path: Path of yaml file
+
+    :returns: Cache dict or None if missing or unreadable
+    """
+
+    try:
+        with open(cache_path(path), "rb") as stream:
+            cached = pickle.load(stream)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        # Corrupt or foreign pickles raise almost anything, the cache is rebuilt then
+        logger.warning("Ignoring unreadable config cache %s: %s", cache_path(path), exc)
+        return None
+
+    if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION or not CACHE_KEYS <= cached.keys():
+        logger.warning("Ignoring invalid config cache %s", cache_path(path))
+        return None
+
+    return cached
+
+
+def _write_cache(path: str, cached: dict) -> None:
+    """
+    Write sidecar cache atomically
+
+    :param path: Path of yaml file
+    :param cached: Cache dict
+    """
+
+    tmp_path = f"{cache_path(path)}.{os.getpid()}.tmp"
+
+    try:
+        with open(tmp_path, "wb") as stream:
+            pickle.dump(cached, stream, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp_path, cache_path(path))
+    except OSError as exc:
+        logger.warning("Can not write config cache %s: %s", cache_path(path), exc)
+
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def dump_yaml(data, stream) -> None:
+    """
+    Dump to yaml with the C emitter if available, same output as yaml.dump
+
+    :param data: Data to dump
+    :param stream: Writable text stream
+    """
+    yaml.dump(data, stream, Dumper=Dumper, default_flow_style=False, sort_keys=False)
+
+
+def dumps_snapshot(data: dict, level: int = 1) -> bytes:
+    """
+    Pack config into compact binary snapshot, i.e. to embed it into run files
+
+    The snapshot has a header with magic, version and payload length,
+    so it can be read from a stream with read_snapshot().
+
+    :param data: JSON serializable config
+    :param level: zlib compression level
+
+    :returns: Snapshot bytes
+    """
+
+    payload = zlib.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), level)
+
+    return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(payload)) + payload
+
+
+def loads_snapshot(snapshot: bytes) -> dict:
+    """
+    Unpack binary snapshot
+
+    :param snapshot: Snapshot bytes
+
+    :returns: Config
+    """
+
+    snapshot = bytes(snapshot)
+
+    if len(snapshot) < SNAPSHOT_HEADER.size:
+        logger.error("Config snapshot too short")
+        raise ValueError("Invalid config snapshot")
+
+    magic, version, length = SNAPSHOT_HEADER.unpack_from(snapshot)
+
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        logger.error("Unknown config snapshot format %s version %d", magic, version)
+        raise ValueError("Invalid config snapshot")
+
+    payload = snapshot[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length]
+
+    if len(payload) != length:
+        logger.error("Config snapshot truncated, %d of %d bytes", len(payload), length)
+        raise ValueError("Invalid config snapshot")
+
+    return json.loads(zlib.decompress(payload))
+
+
+def read_snapshot(stream) -> dict:
+    """
+    Read binary snapshot from a binary stream, the stream is left after the snapshot
+
+    :param stream: Readable binary stream
+
+    :returns: Config
+    """
+
+    header = stream.read(SNAPSHOT_HEADER.size)
+
+    if len(header) < SNAPSHOT_HEADER.size:
+        logger.error("Config snapshot too short")
+        raise ValueError("Invalid config snapshot")
+
+    return loads_snapshot(header + stream.read(SNAPSHOT_HEADER.unpack(header)[2]))
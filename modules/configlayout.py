@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 16:48:05 2026
+
+Compiled bit layout of ASIC config vectors
+"""
+import logging
+from collections import namedtuple
+
+import numpy as np
+from bitstring import BitArray
+
+from modules.setup_logger import logger
+
+
+logger = logging.getLogger(__name__)
+
+Field = namedtuple('Field', ['chip', 'key', 'name', 'offset', 'width', 'reverse'])
+
+
+class ConfigLayout:
+    """Bit layout of the ASIC config vector, compiled once from the config dicts
+
+    Every field knows its bit offset, width and if its bits are reversed. Field values are
+    kept in a flat array and their bits in a preallocated buffer, so changing a field only
+    rewrites its own bits.
+
+    The buffer holds the MSB first vector. The LSB first vector is a fixed permutation of it,
+    for telescopes the vector is reversed after each chip like in Asic.gen_asic_vector.
+    """
+
+    def __init__(self, configs: list, reverse_keys: tuple = ()) -> None:
+        """Init
+
+        :param configs: List of (chip, config dict) in the order they are shifted in
+        :param reverse_keys: Config keys with bitreversed fields, i.e. 'vdacs'
+        """
+
+        fields = []
+        offset = 0
+
+        for chip, config in configs:
+            for key in config:
+                for name, values in config[key].items():
+                    fields.append(Field(chip, key, name, offset, values[0], key in reverse_keys))
+                    offset += values[0]
+
+        self._fields = fields
+        self._index = {(field.chip, field.key, field.name): i for i, field in enumerate(fields)}
+        self._signature = tuple((field.chip, field.key, field.name, field.width) for field in fields)
+
+        self._values = np.zeros(len(fields), dtype=np.int64)
+        self._bits = np.zeros(offset, dtype=np.uint8)
+
+        # LSB first permutation, reverse after each chip
+        lsbfirst = np.zeros(0, dtype=np.intp)
+        for chip, _ in configs:
+            width = sum(field.width for field in fields if field.chip == chip)
+            lsbfirst = np.concatenate((lsbfirst, np.arange(len(lsbfirst), len(lsbfirst) + width)))[::-1]
+
+        self._lsbfirst = lsbfirst
+        self._lsbfirst_inverse = np.argsort(lsbfirst)
+
+        # Fields changed since the last clear_dirty()
+        self._dirty = set()
+
+        for chip, config in configs:
+            for key in config:
+                for name, values in config[key].items():
+                    self.set_value(self._index[(chip, key, name)], values[1])
+
+        self._dirty.clear()
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    @property
+    def fields(self) -> list:
+        """List of fields with chip, key, name, offset, width and reverse flag"""
+        return self._fields
+
+    @property
+    def values(self) -> np.ndarray:
+        """Flat read-only array of field values"""
+        values = self._values.view()
+        values.flags.writeable = False
+        return values
+
+    @property
+    def dirty(self) -> list:
+        """Sorted indices of fields changed since the last clear_dirty()"""
+        return sorted(self._dirty)
+
+    def clear_dirty(self) -> None:
+        """Mark all fields as unchanged"""
+        self._dirty.clear()
+
+    def index(self, key: str, name: str, chip: int = None) -> int:
+        """
+        Get field index
+
+        :param key: Config key, i.e. 'vdacs'
+        :param name: Field name
+        :param chip: Chip number, None for single chip configs
+
+        :returns: Field index
+        """
+        return self._index[(chip, key, name)]
+
+    def set_value(self, index: int, value: int) -> bool:
+        """
+        Set field value and update its bits
+
+        :param index: Field index
+        :param value: Field value
+
+        :returns: True if the value changed
+        """
+
+        field = self._fields[index]
+
+        if not 0 <= value < 1 << field.width:
+            logger.error('%s %s: Allowed Values 0 - %d', field.key, field.name, 2**field.width - 1)
+            raise ValueError(f"Value {value} does not fit in {field.width} bits")
+
+        if self._values[index] == value:
+            return False
+
+        self._values[index] = value
+        self._dirty.add(index)
+
+        bits = (np.uint64(value) >> np.arange(field.width - 1, -1, -1, dtype=np.uint64)) & np.uint64(1)
+        if field.reverse:
+            bits = bits[::-1]
+
+        self._bits[field.offset:field.offset + field.width] = bits
+
+        return True
+
+    def matches(self, configs: list) -> bool:
+        """
+        Check if the config dicts have the compiled structure
+
+        :param configs: List of (chip, config dict)
+
+        :returns: True if field names and widths match
+        """
+        signature = tuple(
+            (chip, key, name, values[0])
+            for chip, config in configs for key in config for name, values in config[key].items()
+        )
+        return signature == self._signature
+
+    def update(self, configs: list) -> int:
+        """
+        Update field values from the config dicts, only changed fields are rewritten
+
+        :param configs: List of (chip, config dict) with the compiled structure
+
+        :returns: Number of changed fields
+        """
+
+        changed = 0
+        index = 0
+
+        for _, config in configs:
+            for key in config:
+                for values in config[key].values():
+                    if self._values[index] != values[1]:
+                        changed += self.set_value(index, values[1])
+                    index += 1
+
+        return changed
+
+    def positions(self, indices: list, msbfirst: bool = False) -> np.ndarray:
+        """
+        Get vector positions of the bits of fields
+
+        :param indices: Field indices
+        :param msbfirst: Positions in the MSB first vector
+
+        :returns: Array with bit positions
+        """
+
+        fields = [self._fields[index] for index in indices]
+
+        if not fields:
+            return np.zeros(0, dtype=np.intp)
+
+        positions = np.concatenate([np.arange(field.offset, field.offset + field.width) for field in fields])
+
+        return positions if msbfirst else self._lsbfirst_inverse[positions]
+
+    def bits(self, msbfirst: bool = False, positions: np.ndarray = None) -> np.ndarray:
+        """
+        Get config vector as bit array
+
+        :param msbfirst: Send vector MSB first
+        :param positions: Only get bits at these vector positions
+
+        :returns: Array with one uint8 per bit
+        """
+
+        if positions is not None:
+            return self._bits[positions] if msbfirst else self._bits[self._lsbfirst[positions]]
+
+        return self._bits.copy() if msbfirst else self._bits[self._lsbfirst]
+
+    def vector(self, msbfirst: bool = False) -> BitArray:
+        """
+        Get config vector
+
+        :param msbfirst: Send vector MSB first
+
+        :returns: BitArray
+        """
+        return BitArray(bytes=np.packbits(self.bits(msbfirst)).tobytes(), length=len(self._bits))
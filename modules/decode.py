@@ -5,26 +5,130 @@ Created on Tue Dec 28 19:03:40 2021
 
 @author: Nicolas Striebig
 """
+import re
+
+import numpy as np
 import pandas as pd
 
 import logging
 from modules.setup_logger import logger
+from modules.spi import REVERSE_BITORDER_TABLE
 
 
 logger = logging.getLogger(__name__)
 
+REVERSE_BITORDER_LUT = np.frombuffer(REVERSE_BITORDER_TABLE, dtype=np.uint8)
+
+SCAN_STRATEGIES = ('numpy', 'find', 'regex')
+
+ASTROPIX2_HIT_DTYPE = np.dtype([
+    ('id', np.uint8), ('payload', np.uint8), ('location', np.uint8),
+    ('col', np.uint8), ('timestamp', np.uint8), ('tot_total', np.uint16)
+])
+
+ASTROPIX4_HIT_DTYPE = np.dtype([
+    ('id', np.uint8), ('payload', np.uint8), ('row', np.uint8), ('col', np.uint8),
+    ('ts1', np.uint16), ('tsfine1', np.uint8), ('ts2', np.uint16), ('tsfine2', np.uint8),
+    ('tsneg1', np.uint8), ('tsneg2', np.uint8), ('tstdc1', np.uint8), ('tstdc2', np.uint8),
+    ('ts_dec1', np.uint32), ('ts_dec2', np.uint32)
+])
+
 
 class Decode:
-    def __init__(self, sampleclock_period_ns: int = 5, nchips: int = 1, bytesperhit: int = 5):
+    def __init__(self, sampleclock_period_ns: int = 5, nchips: int = 1, bytesperhit: int = 5,
+                 debug_hits: bool = False, scan: str = 'numpy', **kwargs):
+        """Init
+
+        :param sampleclock_period_ns: Sampleclock period in ns
+        :param nchips: Number of chips in a row
+        :param bytesperhit: Frame length, 5 for AstroPix2/3 and 8 for AstroPix4
+        :param debug_hits: Log every decoded hit
+        :param scan: Header search strategy, see SCAN_STRATEGIES. numpy is fastest for dense streams
+                     with less than ~500 idle bytes per hit, find is faster above ~1000 bytes per hit,
+                     i.e. 4-6 times at 5000-20000 bytes, regex is slower than find in all cases
+        :param num_cols: Number of columns, used for frame validation
+        :param num_rows: Number of rows, used for frame validation
+        """
+
+        if scan not in SCAN_STRATEGIES:
+            logger.error("Unknown scan strategy %s, use one of %s", scan, SCAN_STRATEGIES)
+            raise ValueError(scan)
+
         self._sampleclock_period_ns = sampleclock_period_ns
         self._bytesperhit = bytesperhit
         self._idbits = 3
         self._nchips = nchips
+        self._debug_hits = debug_hits
+        self._scan = scan
+
+        self._num_cols = kwargs.get('num_cols')
+        self._num_rows = kwargs.get('num_rows')
+
+        self._chip_hits = np.zeros(nchips, dtype=np.int64)
 
         self._header = set()
         self._header_rev = set()
+        self._header_regex = None
+        self._header_rev_regex = None
         self._gen_header()
 
+    @classmethod
+    def from_asic(cls, asic, **kwargs):
+        """
+        Create decoder for the chip configured in an Asic instance
+
+        Takes number of chips and geometry from Asic.load_conf_from_yaml()
+
+        :param asic: Asic instance with loaded config
+        :param kwargs: Additional Decode arguments
+
+        :returns: Decode instance
+        """
+        kwargs.setdefault('bytesperhit', 8 if asic.chipversion >= 4 else 5)
+
+        return cls(nchips=asic.num_chips, num_cols=asic.num_cols, num_rows=asic.num_rows, **kwargs)
+
+    @property
+    def bytesperhit(self) -> int:
+        """Get number of bytes per frame
+
+        :returns: Bytes per frame
+        """
+        return self._bytesperhit
+
+    @property
+    def nchips(self) -> int:
+        """Get number of chips in a row
+
+        :returns: Number of chips
+        """
+        return self._nchips
+
+    @property
+    def chip_hits(self) -> np.ndarray:
+        """Get number of hits per chip routed by demux_frames() and decode_per_chip()
+
+        :returns: Array with hit counter per chip id
+        """
+        return self._chip_hits
+
+    def reset_chip_hits(self) -> None:
+        """Reset hit counters per chip"""
+
+        self._chip_hits = np.zeros(self._nchips, dtype=np.int64)
+
+    @property
+    def debug_hits(self) -> bool:
+        """Get/set per-hit debug dump of decoded hits
+
+        :returns: True if every decoded hit gets logged
+        """
+        return self._debug_hits
+
+    @debug_hits.setter
+    def debug_hits(self, enable: bool):
+        self._debug_hits = enable
+
     def _gen_header(self):
         """
         Pregenerate header bytes for nchips in a row
@@ -37,8 +141,11 @@ class Decode:
             id = (i << self._idbits) + self._bytesperhit - 1
             self._header.add(id)
 
-            id_rev = int(f'{id:08b}'[::-1], 2)
-            self._header_rev.add(id_rev)
+            self._header_rev.add(REVERSE_BITORDER_TABLE[id])
+
+        # Character classes for regex header search
+        self._header_regex = re.compile(b'[' + re.escape(bytes(sorted(self._header))) + b']')
+        self._header_rev_regex = re.compile(b'[' + re.escape(bytes(sorted(self._header_rev))) + b']')
 
     def gray_to_dec(self, gray: int) -> int:
         """
@@ -54,47 +161,284 @@ class Decode:
             bits >>= 1
         return gray
 
+    @staticmethod
+    def gray_to_dec_array(gray: np.ndarray, nbits: int = 17) -> np.ndarray:
+        """
+        Decode array of Gray codes to decimal
+
+        Uses a fixed number of shift-xor steps, ceil(log2(nbits)), instead of a loop per value.
+
+        :param gray: Array with Gray codes
+        :param nbits: Bitwidth of the Gray codes
+
+        :returns: Array with decoded decimals
+        """
+        dec = np.array(gray, dtype=np.uint32)
+
+        shift = 1
+        while shift < nbits:
+            dec ^= dec >> shift
+            shift <<= 1
+
+        return dec
+
     def reverse_bitorder(self, data: bytearray) -> bytearray:
-        reversed_data = bytearray()
+        """
+        Reverse bitorder of each byte
+
+        :param data: Bytearray
+
+        :returns: Bytearray with reversed bitorder
+        """
+        return bytearray(data).translate(REVERSE_BITORDER_TABLE)
+
+    def _header_candidates(self, readout: np.ndarray, reverse_bitorder: bool, buffer=None) -> np.ndarray:
+        """
+        Find positions of all header bytes in readoutstream
+
+        numpy compares all bytes at once. find and regex skip idle bytes with C-level searches,
+        so their runtime scales with the number of hits instead of the stream length. find searches
+        bytes and bytearray streams in place and falls back to numpy for streams with more than
+        one header per 512 bytes. regex gets slow with the number of header values, i.e. chips.
+
+        :param readout: Readout stream as uint8 array
+        :param reverse_bitorder: Search for headers with reversed bitorder
+        :param buffer: bytes or bytearray behind readout, searched by find without a copy
+
+        :returns: Sorted array with header positions
+        """
+
+        header = sorted(self._header_rev if reverse_bitorder else self._header)
+
+        if self._scan == 'regex':
+            regex = self._header_rev_regex if reverse_bitorder else self._header_regex
+
+            return np.fromiter((match.start() for match in regex.finditer(memoryview(readout))), dtype=np.intp)
+
+        if self._scan == 'find':
+            data = buffer if isinstance(buffer, (bytes, bytearray)) else readout.tobytes()
+            limit = max(readout.size >> 9, 64)
+            candidates = []
+
+            for value in header:
+                index = data.find(value)
+
+                while index >= 0 and len(candidates) < limit:
+                    candidates.append(index)
+                    index = data.find(value, index + 1)
+
+                if index >= 0:
+                    break
+            else:
+                return np.sort(np.array(candidates, dtype=np.intp))
+
+        mask = readout == header[0]
 
-        for item in data:
-            item_rev = int(bin(item)[2:].zfill(8)[::-1], 2)
-            reversed_data.append(item_rev)
+        for value in header[1:]:
+            mask |= readout == value
 
-        return reversed_data
+        return np.flatnonzero(mask)
 
-    def hits_from_readoutstream(self, readout: bytearray, reverse_bitorder: bool = True) -> list:
+    def _hit_offsets(self, readout: np.ndarray, reverse_bitorder: bool, buffer=None) -> np.ndarray:
+        """
+        Find start offsets of all frames in readoutstream
+
+        A header byte starts a frame and the following bytesperhit - 1 bytes are skipped,
+        even if they contain header values. The last frame may exceed the stream end.
+
+        :param readout: Readout stream as uint8 array
+        :param reverse_bitorder: Search for headers with reversed bitorder
+        :param buffer: bytes or bytearray behind readout, see _header_candidates()
+
+        :returns: Array with frame start offsets
+        """
+
+        candidates = self._header_candidates(readout, reverse_bitorder, buffer)
+
+        return candidates[self._select_frames(candidates)]
+
+    def _select_frames(self, candidates: np.ndarray) -> np.ndarray:
+        """
+        Select header candidates, which are not part of a preceding frame
+
+        :param candidates: Sorted header positions
+
+        :returns: Boolean array, True for selected candidates
+        """
+
+        bytesperhit = self._bytesperhit
+        keep = np.ones(candidates.size, dtype=bool)
+
+        # Header values inside of frames, only walk through candidates closer than one frame
+        overlaps = np.flatnonzero(np.diff(candidates) < bytesperhit)
+
+        if overlaps.size:
+            positions = candidates.tolist()
+            start = 0
+
+            for index in overlaps.tolist():
+                if keep[index]:
+                    start = positions[index]
+
+                keep[index + 1] = positions[index + 1] >= start + bytesperhit
+
+        return keep
+
+    def _gather_frames(self, readout: np.ndarray, offsets: np.ndarray, reverse_bitorder: bool) -> np.ndarray:
+        """
+        Copy frames into one contiguous frame array
+
+        :param readout: Readout stream as uint8 array
+        :param offsets: Frame start offsets
+        :param reverse_bitorder: Reverse Bitorder per byte
+
+        :returns: Frame array with shape (N, bytesperhit)
+        """
+
+        frames = readout[offsets[:, None] + np.arange(self._bytesperhit)]
+
+        if reverse_bitorder:
+            np.take(REVERSE_BITORDER_LUT, frames, out=frames)
+
+        return frames
+
+    def validate_frames(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Check frames for reserved bits and pixel position
+
+        AstroPix 2: Byte 1 bit 6 and upper nibble of ToT MSB must be 0
+        Row and col are checked against the geometry, if num_cols and num_rows are set.
+
+        :param frames: Frame array with shape (N, bytesperhit)
+
+        :returns: Boolean array, True for valid frames
+        """
+
+        frames = self._frames_from_hits(frames)
+
+        if self._bytesperhit == 5:
+            valid = ((frames[:, 1] & 0b01000000) == 0) & ((frames[:, 3] & 0b11110000) == 0)
+
+            if self._num_cols is not None and self._num_rows is not None:
+                location = frames[:, 1] & 0b111111
+                valid &= location < np.where(frames[:, 1] >> 7, self._num_cols, self._num_rows)
+
+        else:
+            valid = np.ones(len(frames), dtype=bool)
+
+            if self._num_cols is not None and self._num_rows is not None:
+                valid &= (frames[:, 1] >> 3) < self._num_rows
+                valid &= (((frames[:, 1] & 0b111) << 2) + (frames[:, 2] >> 6)) < self._num_cols
+
+        return valid
+
+    def hit_offsets(self, readout: bytearray, reverse_bitorder: bool = True) -> np.ndarray:
+        """
+        Find start offsets of complete frames in readoutstream
+
+        :param readout: Readout stream
+        :param reverse_bitorder: Search for headers with reversed bitorder
+
+        :returns: Array with frame start offsets
+        """
+
+        data = np.frombuffer(readout, dtype=np.uint8)
+        offsets = self._hit_offsets(data, reverse_bitorder, readout)
+
+        return offsets[offsets + self._bytesperhit <= data.size]
+
+    def frames_at(self, readout: bytearray, offsets: np.ndarray, reverse_bitorder: bool = True) -> np.ndarray:
+        """
+        Pack frames at given offsets into one contiguous frame array
+
+        :param readout: Readout stream
+        :param offsets: Frame start offsets from hit_offsets()
+        :param reverse_bitorder: Reverse Bitorder per byte
+
+        :returns: Frame array with shape (N, bytesperhit)
+        """
+        return self._gather_frames(np.frombuffer(readout, dtype=np.uint8), offsets, reverse_bitorder)
+
+    def hits_from_readoutstream(self, readout: bytearray, reverse_bitorder: bool = True,
+                                packed: bool = False):
         """
         Find hits in readoutstream
 
+        With packed=True all hits are returned in one frame array instead of one bytearray
+        per hit, which can be passed to the decode functions directly.
+
         :param readout: Readout stream
         :param reverse_bitorder: Reverse Bitorder per byte
+        :param packed: Return frame array with shape (N, bytesperhit)
 
         :returns: Position of hits in the datastream
         """
 
-        length = len(readout)
-        hitlist = []
-        i = 0
-
-        header = self._header_rev if reverse_bitorder else self._header
         bytesperhit = self._bytesperhit
 
-        while i < length:
-            if readout[i] not in header:
-                i += 1
-            else:
-                if i + bytesperhit <= length:
-                    if reverse_bitorder:
-                        hitlist.append(self.reverse_bitorder(readout[i:i + bytesperhit]))
-                    else:
-                        hitlist.append(readout[i:i + bytesperhit])
-
-                    i += bytesperhit
-                else:
-                    break
+        frames = self.frames_at(readout, self.hit_offsets(readout, reverse_bitorder), reverse_bitorder)
+
+        if packed:
+            return frames
 
-        return hitlist
+        frames = bytearray(frames.tobytes())
+
+        return [frames[i:i + bytesperhit] for i in range(0, len(frames), bytesperhit)]
+
+    def _frames_from_hits(self, list_hits) -> np.ndarray:
+        """
+        Pack hits into one contiguous frame array
+
+        Frame arrays and packed buffers (bytes, memoryview) are used without copy.
+
+        :param list_hits: List with all hits, frame array or packed buffer
+
+        :returns: Array with shape (N, bytesperhit), hits with wrong length are dropped
+        """
+
+        if isinstance(list_hits, np.ndarray):
+            return list_hits.reshape(-1, self._bytesperhit)
+
+        if isinstance(list_hits, (bytes, bytearray, memoryview)):
+            return np.frombuffer(list_hits, dtype=np.uint8).reshape(-1, self._bytesperhit)
+
+        data = b''.join(bytes(hit) for hit in list_hits if len(hit) == self._bytesperhit)
+
+        return np.frombuffer(data, dtype=np.uint8).reshape(-1, self._bytesperhit)
+
+    @staticmethod
+    def hits_to_dataframe(hits: np.ndarray) -> pd.DataFrame:
+        """
+        Convert structured hit array to Dataframe
+
+        :param hits: Structured array with decoded hits
+
+        :returns: Dataframe with one int64 column per field
+        """
+        return pd.DataFrame({name: hits[name].astype(np.int64) for name in hits.dtype.names})
+
+    def decode_astropix2_frames(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Decode 5byte Frames from AstroPix 2 in one batch
+
+        See decode_astropix2_hits() for the frame layout.
+
+        :param frames: Frame array with shape (N, 5) and dtype uint8 or packed buffer
+
+        :returns: Structured array with decoded hits, see ASTROPIX2_HIT_DTYPE
+        """
+
+        frames = self._frames_from_hits(frames)
+        hits = np.empty(len(frames), dtype=ASTROPIX2_HIT_DTYPE)
+
+        hits['id']          = frames[:, 0] >> 3
+        hits['payload']     = frames[:, 0] & 0b111
+        hits['location']    = frames[:, 1] & 0b111111
+        hits['col']         = frames[:, 1] >> 7 & 1
+        hits['timestamp']   = frames[:, 2]
+        hits['tot_total']   = (frames[:, 3].astype(np.uint16) & 0b1111) << 8 | frames[:, 4]
+
+        return hits
 
     def decode_astropix2_hits(self, list_hits: list) -> pd.DataFrame:
         """
@@ -115,31 +459,76 @@ class Decode:
         :returns: Dataframe with decoded hits
         """
 
-        hit_pd = []
+        frames = self._frames_from_hits(list_hits)
+        hits = self.decode_astropix2_frames(frames)
+
+        if len(hits) and logger.isEnabledFor(logging.INFO):
+            ids, counts = np.unique(hits['id'], return_counts=True)
+
+            logger.info(
+                "Decoded %d hits\tChipIds: %s\tToT: %d - %d",
+                len(hits), dict(zip(ids.tolist(), counts.tolist())),
+                hits['tot_total'].min(), hits['tot_total'].max()
+            )
+
+        if self._debug_hits:
+            self._dump_astropix2_hits(hits, frames)
 
-        for hit in list_hits:
-            if len(hit) == self._bytesperhit:
-                header, location, timestamp, tot_msb, tot_lsb = hit
+        return self.hits_to_dataframe(hits)
 
-                id          = header >> 3
-                payload     = header & 0b111
-                col         = location >> 7 & 1
-                location   &= 0b111111
-                timestamp   = timestamp
-                tot_msb    &= 0b1111
-                tot_total   = (tot_msb << 8) + tot_lsb
+    def _dump_astropix2_hits(self, hits: np.ndarray, frames: np.ndarray) -> None:
+        """
+        Log every decoded hit, only used with debug_hits enabled
+
+        :param hits: Structured array with decoded hits
+        :param frames: Frame array of the decoded hits
+        """
 
-                hit_pd.append([id, payload, location, col, timestamp, tot_total])
-                logger.info(
-                    "Header: ChipId: %d\tPayload: %d\n"
-                    "Location: %d\tRow/Col: %d\n"
-                    "Timestamp: %d\n"
-                    "ToT: MSB: %d\tLSB: %d Total: %d (%d us)",
-                    id, payload, location, col, timestamp, tot_msb, tot_lsb, tot_total,
-                    (tot_total * self._sampleclock_period_ns) / 1000.0
-                )
+        for hit, frame in zip(hits.tolist(), frames.tolist()):
+            id, payload, location, col, timestamp, tot_total = hit
 
-        return pd.DataFrame(hit_pd, columns=['id', 'payload', 'location', 'col', 'timestamp', 'tot_total'])
+            logger.debug(
+                "Header: ChipId: %d\tPayload: %d\n"
+                "Location: %d\tRow/Col: %d\n"
+                "Timestamp: %d\n"
+                "ToT: MSB: %d\tLSB: %d Total: %d (%d us)",
+                id, payload, location, col, timestamp, frame[3] & 0b1111, frame[4], tot_total,
+                (tot_total * self._sampleclock_period_ns) / 1000.0
+            )
+
+    def decode_astropix4_frames(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Decode 8byte Frames from AstroPix 4 in one batch
+
+        :param frames: Frame array with shape (N, 8) and dtype uint8 or packed buffer
+
+        :returns: Structured array with decoded hits, see ASTROPIX4_HIT_DTYPE
+        """
+
+        frames = self._frames_from_hits(frames)
+        hits = np.empty(len(frames), dtype=ASTROPIX4_HIT_DTYPE)
+
+        header, byte1, byte2, byte3, byte4, byte5, byte6, byte7 = frames.astype(np.uint16).T
+
+        hits['id']          = header >> 3
+        hits['payload']     = header & 0b111
+        hits['row']         = byte1 >> 3
+        hits['col']         = ((byte1 & 0b111) << 2) + (byte2 >> 6)
+
+        hits['tsneg1']      = (byte2 >> 5) & 0b1
+        hits['ts1']         = ((byte2 & 0b11111) << 9) + (byte3 << 1) + (byte4 >> 7)
+        hits['tsfine1']     = (byte4 >> 4) & 0b111
+        hits['tstdc1']      = ((byte4 & 0b1111) << 1) + (byte5 >> 7)
+
+        hits['tsneg2']      = (byte5 >> 6) & 0b1
+        hits['ts2']         = ((byte5 & 0b111111) << 8) + byte6
+        hits['tsfine2']     = (byte7 >> 5) & 0b111
+        hits['tstdc2']      = byte7 & 0b11111
+
+        hits['ts_dec1']     = self.gray_to_dec_array((hits['ts1'].astype(np.uint32) << 3) + hits['tsfine1'])
+        hits['ts_dec2']     = self.gray_to_dec_array((hits['ts2'].astype(np.uint32) << 3) + hits['tsfine2'])
+
+        return hits
 
     def decode_astropix4_hits(self, list_hits: list) -> pd.DataFrame:
         """
@@ -150,28 +539,224 @@ class Decode:
         :returns: Dataframe with decoded hits
         """
 
-        hit_pd = []
+        return self.hits_to_dataframe(self.decode_astropix4_frames(list_hits))
+
+    def _split_by_id(self, data: np.ndarray, ids: np.ndarray) -> dict:
+        """
+        Split array by chip id and update hit counters
+
+        :param data: Array with one entry per hit
+        :param ids: Chip id per hit
+
+        :returns: Dict with chip id as key and array with the hits of this chip as value
+        """
+
+        counts = np.bincount(ids, minlength=self._nchips)
+        order = np.argsort(ids, kind='stable')
+
+        if counts.size > self._chip_hits.size:
+            logger.warning("Found chip ids up to %d, expected %d chips", counts.size - 1, self._nchips)
+            self._chip_hits = np.pad(self._chip_hits, (0, counts.size - self._chip_hits.size))
+
+        self._chip_hits += counts
+
+        return dict(enumerate(np.split(data[order], np.cumsum(counts)[:-1])))
+
+    def demux_frames(self, frames: np.ndarray) -> dict:
+        """
+        Route frames by chip id
+
+        :param frames: Frame array with shape (N, bytesperhit) or packed buffer
+
+        :returns: Dict with chip id as key and frame array of this chip as value
+        """
+
+        frames = self._frames_from_hits(frames)
+
+        return self._split_by_id(frames, frames[:, 0] >> 3)
+
+    def decode_per_chip(self, frames: np.ndarray) -> dict:
+        """
+        Decode frames of all chips in a telescope and route hits by chip id
+
+        Frames are decoded in one batch, which is then split into one structured array per chip.
+        Frame layout is selected by bytesperhit.
+
+        :param frames: Frame array with shape (N, bytesperhit) or packed buffer
+
+        :returns: Dict with chip id as key and structured array with decoded hits as value
+        """
+
+        if self._bytesperhit == 8:
+            hits = self.decode_astropix4_frames(frames)
+        else:
+            hits = self.decode_astropix2_frames(frames)
+
+        return self._split_by_id(hits, hits['id'])
+
+
+class DecodeStream:
+    """Find frames in continuous readout, which is read in chunks
+
+    Frames crossing the end of a chunk are kept and completed with the next chunk.
+    With validate=True invalid frames are rejected and the search restarts at the next
+    header byte after the rejected header.
+    """
+
+    def __init__(self, decode: Decode, reverse_bitorder: bool = True, validate: bool = False) -> None:
+        """Init
+
+        :param decode: Decode instance, defines frame length, headers and geometry
+        :param reverse_bitorder: Reverse Bitorder per byte
+        :param validate: Check frames with Decode.validate_frames()
+        """
+
+        self._decode = decode
+        self._reverse_bitorder = reverse_bitorder
+        self._validate = validate
+
+        self._tail = np.empty(0, dtype=np.uint8)
+
+        self._accepted = 0
+        self._rejected = 0
+        self._resync = 0
+        self._insync = True
 
-        for hit in list_hits:
-            if len(hit) == self._bytesperhit:
-                header, byte1, byte2, byte3, byte4, byte5, byte6, byte7 = hit
+    @property
+    def pending(self) -> int:
+        """Get number of buffered bytes of an incomplete frame
+
+        :returns: Number of buffered bytes
+        """
+        return self._tail.size
+
+    @property
+    def stats(self) -> dict:
+        """Get frame counters
+
+        accepted: Valid frames
+        rejected: Frames failing validation
+        resync: Number of times a valid frame was found after rejected frames
+
+        :returns: Dict with frame counters
+        """
+        return {'accepted': self._accepted, 'rejected': self._rejected, 'resync': self._resync}
+
+    def reset(self) -> None:
+        """Drop incomplete frame, i.e. after FPGA readout reset"""
+
+        self._tail = np.empty(0, dtype=np.uint8)
+
+    def reset_stats(self) -> None:
+        """Reset frame counters"""
+
+        self._accepted = 0
+        self._rejected = 0
+        self._resync = 0
+
+    def _select_valid(self, candidates: np.ndarray, valid: np.ndarray) -> tuple[list, int]:
+        """
+        Walk through header candidates, skip frames after valid headers and resync after invalid
+
+        :param candidates: Header positions
+        :param valid: Validation result for each candidate with complete frame
+
+        :returns: Selected candidate indices, index of first candidate with incomplete frame
+        """
 
-                id          = header >> 3
-                payload     = header & 0b111
-                row         = byte1 >> 3
-                col         = ((byte1 & 0b111) << 2) + (byte2 >> 6)
+        nextframe = np.searchsorted(candidates, candidates + self._decode.bytesperhit).tolist()
+        valid = valid.tolist()
 
-                tsneg1      = (byte2 >> 5) & 0b1
-                ts1         = ((byte2 & 0b11111) << 9) + (byte3 << 1) + (byte4 >> 7)
-                tsfine1     = (byte4 >> 4) & 0b111
-                tstdc1      = ((byte4 & 0b1111) << 1) + (byte5 >> 7)
+        selected = []
+        index = 0
 
-                tsneg2      = (byte5 >> 6) & 0b1
-                ts2         = ((byte5 & 0b111111) << 8) + byte6
-                tsfine2     = (byte7 >> 5) & 0b111
-                tstdc2      = byte7 & 0b11111
+        while index < len(valid):
+            if valid[index]:
+                if not self._insync:
+                    self._resync += 1
+                    self._insync = True
+
+                selected.append(index)
+                index = nextframe[index]
+            else:
+                self._rejected += 1
+                self._insync = False
+                index += 1
+
+        return selected, index
+
+    def feed(self, readout: bytearray) -> np.ndarray:
+        """
+        Find complete frames in next chunk of the readout stream
+
+        :param readout: Next chunk of the readout stream
+
+        :returns: Frame array with shape (N, bytesperhit)
+        """
+
+        decode = self._decode
+        bytesperhit = decode.bytesperhit
+
+        if self._tail.size:
+            readout = bytearray(self._tail) + readout
+
+        data = np.frombuffer(readout, dtype=np.uint8)
+
+        if not self._validate:
+            offsets = decode._hit_offsets(data, self._reverse_bitorder, readout)
+
+            # Keep incomplete last frame for the next chunk
+            if offsets.size and offsets[-1] + bytesperhit > data.size:
+                self._tail = data[offsets[-1]:].copy()
+                offsets = offsets[:-1]
+            else:
+                self._tail = np.empty(0, dtype=np.uint8)
+
+            self._accepted += offsets.size
+
+            return decode._gather_frames(data, offsets, self._reverse_bitorder)
+
+        candidates = decode._header_candidates(data, self._reverse_bitorder, readout)
+        complete = np.count_nonzero(candidates + bytesperhit <= data.size)
+
+        frames = decode._gather_frames(data, candidates[:complete], self._reverse_bitorder)
+        rejected = self._rejected
+
+        valid = decode.validate_frames(frames)
+
+        # Without rejected frames the frame walk is the same as without validation
+        selected = np.flatnonzero(decode._select_frames(candidates))
+        index = selected[-1] if selected.size and selected[-1] >= complete else candidates.size
+        selected = selected[selected < complete]
+
+        if valid[selected].all():
+            if selected.size and not self._insync:
+                self._resync += 1
+                self._insync = True
+        else:
+            selected, index = self._select_valid(candidates, valid)
+
+        # Keep incomplete frame for the next chunk
+        if index < candidates.size:
+            self._tail = data[candidates[index]:].copy()
+        else:
+            self._tail = np.empty(0, dtype=np.uint8)
+
+        if self._rejected > rejected:
+            logger.warning("Rejected %d invalid frames", self._rejected - rejected)
+
+        self._accepted += len(selected)
+
+        return frames[selected]
+
+    def iter_frames(self, chunks):
+        """
+        Generator yielding complete frames per chunk
+
+        :param chunks: Iterable with readout chunks, i.e. read_spi_fifo() results
+
+        :returns: Frame arrays with shape (N, bytesperhit)
+        """
 
-                hit_pd.append([id, payload, row, col, ts1, tsfine1, ts2, tsfine2, tsneg1, tsneg2, tstdc1, tstdc2,
-                               self.gray_to_dec((ts1 << 3) + tsfine1), self.gray_to_dec((ts2 << 3) + tsfine2)])
-        return pd.DataFrame(hit_pd, columns=['id', 'payload', 'row', 'col', 'ts1', 'tsfine1', 'ts2',
-                                             'tsfine2', 'tsneg1', 'tsneg2', 'tstdc1', 'tstdc2', 'ts_dec1', 'ts_dec2'])
+        for readout in chunks:
+            yield self.feed(readout)
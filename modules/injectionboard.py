@@ -34,7 +34,7 @@ class Injectionboard(Nexysio):
         :param onchip: Set if onchip injection circuit is used
         """
 
-        self._handle = handle
+        super().__init__(handle)
 
         self._period = 0
         self._cycle = 0
@@ -214,8 +214,6 @@ class Injectionboard(Nexysio):
         :returns: config vector
         """
 
-        logger.info("\nWrite Injection Config\n===============================")
-
         if self._onchip:
             output = self.write_register(PG_OUTPUT, 2)
         else:
@@ -263,38 +261,57 @@ class Injectionboard(Nexysio):
 
         return bytes(data)
 
-    def update_inj(self) -> None:
-        """Update injectionboard"""
+    def update_inj(self, force: bool = False) -> None:
+        """Update injectionboard, unchanged amplitude and pattern config are not rewritten
 
-        # Update amplitude
-        self.update_inj_amplitude()
+        :param force: Write amplitude and pattern config even if unchanged
+        """
 
-        # Stop injection
-        self.write(self.__stop())
+        with self.transaction():
+            # Update amplitude
+            self.update_inj_amplitude(force)
+
+            # Stop injection
+            self.write(self.__stop())
+
+            # Configure injection
+            injconfig = self.__configureinjection()
+            digest = self.config_digest(injconfig)
+
+            if self.config_changed('inj', digest, force):
+                logger.info("\nWrite Injection Config\n===============================")
 
-        # Configure injection
-        self.write(self.__configureinjection())
+                if self.write(injconfig):
+                    self.config_written('inj', digest)
 
-    def update_inj_amplitude(self) -> None:
-        """Write injection amplitude"""
+    def update_inj_amplitude(self, force: bool = False) -> None:
+        """Write injection amplitude
+
+        :param force: Write amplitude even if unchanged
+        """
         if not self._onchip:
             self._injvoltage.dacvalues = (2, [self._amplitude, 0])
-            self._injvoltage.update_vb()
+            self._injvoltage.update_vb(force)
         else:
             pass
             # TODO: update asic config if onchip vdacs are used
 
-    def start(self) -> None:
-        """Start injection"""
+    def start(self, force: bool = False) -> None:
+        """Start injection
 
-        # Stop injection
-        self.write(self.__stop())
+        :param force: Write amplitude and pattern config even if unchanged
+        """
+
+        # Send all commands in one USB write
+        with self.transaction():
+            # Stop injection
+            self.write(self.__stop())
 
-        # Update injboard amplitude
-        self.update_inj()
+            # Update injboard amplitude
+            self.update_inj(force)
 
-        # Start Injection
-        self.write(self.__start())
+            # Start Injection
+            self.write(self.__start())
 
         logger.info("Start injection")
 
@@ -7,13 +7,20 @@ Created on Fri Jun 25 16:10:45 2021
 
 """
 import ftd2xx as ftd
+import hashlib
+import numpy as np
 import sys
+import threading
 import time
+from contextlib import contextmanager
+from functools import lru_cache
 
 import logging
 import binascii
 
-from modules.spi import Spi
+from modules.ringbuffer import RingBuffer
+from modules.spi import Spi, SPI_CONFIG_REG, SPI_WRITE_FIFO_EMPTY, SPI_WRITE_FIFO_FULL, \
+    SPI_READ_FIFO_EMPTY, SPI_READ_FIFO_FULL
 from modules.setup_logger import logger
 
 READ_ADRESS     = 0x00
@@ -31,16 +38,163 @@ LD_GECCO        = 0x04
 NEXYS_USB_DESC  = b'Digilent USB Device A'
 NEXYS_USB_SER   = b'210276'
 
+USB_FRAME_SIZE  = 64000
+
+# Clock signals of the waveform per bit, data signal is ORed for bit 1
+ASIC_CLOCKS     = (0x00, 0x01, 0x00, 0x02, 0x00)  # double clocked
+GECCO_CLOCKS    = (0x00, 0x01, 0x00)
+READBACK_CLOCKS = (0x04, 0x05, 0x04, 0x06, 0x04)
+
+# Read-only status bits, never taken from the register shadow cache
+VOLATILE_BITS   = {
+    SPI_CONFIG_REG: SPI_WRITE_FIFO_EMPTY | SPI_WRITE_FIFO_FULL | SPI_READ_FIFO_EMPTY | SPI_READ_FIFO_FULL
+}
+
+# Registers also written by patterns, always read-modify-written against the hardware
+UNCACHED_REGISTERS = frozenset({SR_ASIC_ADRESS})
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=32)
+def waveform_table(sin: int, clocks: tuple, clkdiv: int) -> np.ndarray:
+    """
+    Lookup table with clockdivided waveform for bit 0 and bit 1
+
+    :param sin: Data signal, set in the waveform of bit 1
+    :param clocks: Clock signals per waveform step
+    :param clkdiv: Clockdivider
+
+    :returns: Array with shape (2, len(clocks) * clkdiv)
+    """
+
+    table = np.array([clocks, [sin | clk for clk in clocks]], dtype=np.uint8)
+    table = np.repeat(table, max(clkdiv, 1), axis=1)
+    table.flags.writeable = False
+
+    return table
+
+
+def bitvector_to_array(value) -> np.ndarray:
+    """
+    Convert bitvector to array with one uint8 per bit
+
+    :param value: BitArray or iterable with bits
+
+    :returns: Array with 0/1 per bit
+    """
+
+    if hasattr(value, 'tobytes'):
+        return np.unpackbits(np.frombuffer(value.tobytes(), dtype=np.uint8))[:len(value)]
+
+    return (np.fromiter(value, dtype=np.uint8, count=len(value)) == 1).view(np.uint8)
+
+
+class Transaction:
+    """Collects writes to the FTDI chip and sends them at commit
+
+    Writes are packed into as few USB writes as possible, single writes are not split
+    unless they exceed the USB frame size.
+    """
+
+    def __init__(self, nexys) -> None:
+        self._nexys = nexys
+        self._parts = []
+        self._length = 0
+        self._callbacks = []
+
+        # Register values written in this transaction, not sent yet
+        self.registers = {}
+
+    def __len__(self) -> int:
+        return self._length
+
+    def append(self, value: bytes) -> None:
+        """
+        Add write to transaction
+
+        :param value: Bytestring to write
+        """
+        self._parts.append(bytes(value))
+        self._length += len(value)
+
+    def after_commit(self, callback) -> None:
+        """
+        Call function after the collected writes were sent, dropped if the transaction is discarded
+
+        :param callback: Function without arguments
+        """
+        self._callbacks.append(callback)
+
+    def commit(self) -> int:
+        """
+        Send collected writes, callbacks are dropped if a write fails
+
+        :returns: Number of successful USB writes
+        """
+
+        frames = []
+        frame = bytearray()
+
+        for part in self._parts:
+            if frame and len(frame) + len(part) > USB_FRAME_SIZE:
+                frames.append(frame)
+                frame = bytearray()
+
+            frame.extend(part)
+
+        if frame:
+            frames.append(frame)
+
+        logger.debug("Commit transaction: %d Bytes in %d writes", self._length, len(frames))
+
+        sent = 0
+
+        for frame in frames:
+            if not self._nexys.write_direct(bytes(frame)):
+                logger.error("Commit transaction failed after %d of %d writes", sent, len(frames))
+                break
+            sent += 1
+
+        callbacks = self._callbacks if sent == len(frames) else []
+
+        self._parts = []
+        self._length = 0
+        self._callbacks = []
+        self.registers = {}
+
+        for callback in callbacks:
+            callback()
+
+        return sent
+
+
 class Nexysio(Spi):
     """Interface to Nexys FTDI Chip"""
 
+    # Serializes USB transactions of all instances, i.e. with the readout thread
+    _usb_lock = threading.RLock()
+
+    # Open transactions of the current thread by device handle
+    _transactions = threading.local()
+
+    # Shadow copies of sent register values by device handle, shared by all instances
+    _register_caches = {}
+
     def __init__(self, handle=0) -> None:
         super().__init__()
         self._handle = handle
 
+        self._readout_thread = None
+        self._readout_stop = threading.Event()
+        self._readout_buffer = None
+        self._readout_error = None
+
+        # Digests of the last written configurations
+        self._written_configs = {}
+        self._config_writes = 0
+        self._config_skips = 0
+
     @classmethod
     def __addbytes(cls, value: bytearray, clkdiv: int) -> bytearray:
         """
@@ -52,17 +206,29 @@ class Nexysio(Spi):
         :returns: Device handle
         """
 
-        data = bytearray()
-
         clkdiv = max(clkdiv, 1)
 
-        for byte in value:
-            data.extend([byte] * clkdiv)
+        return bytearray(np.repeat(np.frombuffer(bytes(value), dtype=np.uint8), clkdiv).tobytes())
 
-        return data
+    @staticmethod
+    def gen_waveform(value, sin: int, clocks: tuple, clkdiv: int) -> bytearray:
+        """
+        Map bitvector to clockdivided waveform with a precompiled lookup table
+
+        :param value: Bitvector
+        :param sin: Data signal, set in the waveform of bit 1
+        :param clocks: Clock signals per waveform step
+        :param clkdiv: Clockdivider
+
+        :returns: Bytearray with waveform
+        """
+        return bytearray(waveform_table(sin, clocks, clkdiv)[bitvector_to_array(value)].tobytes())
 
     def debug_print(self, name: str, length: int, hbyte: int, lbyte: int,
                     header: bytearray, value: bytearray):
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+
         logger.debug(
             "\nWrite %s\n===============================\
             Length: %d hByte: %d lByte: %d\n\
@@ -131,24 +297,104 @@ class Nexysio(Spi):
         logger.error('Nexys not found')
         return False
 
-    def write(self, value: bytes) -> None:
+    def write(self, value: bytes) -> bool:
         """
-        Direct write to FTDI chip
+        Direct write to FTDI chip, collected if a transaction is open
 
         Use with caution!
 
         :param value: Bytestring to write
+
+        :returns: True if written or collected
         """
-        try:
-            # split large vectors into multiple parts
-            while len(value) > 64000:
-                logger.debug("Split writevector in parts")
-                self._handle.write(value[0:63999])
-                value = value[64000:]
 
-            self._handle.write(value)
+        transaction = self.__get_transaction()
+
+        if transaction is not None:
+            transaction.append(value)
+            return True
+
+        return self.write_direct(value)
+
+    def write_direct(self, value: bytes) -> bool:
+        """
+        Direct write to FTDI chip, bypasses transactions
+
+        Use with caution!
+
+        :param value: Bytestring to write
+
+        :returns: True if written
+        """
+        try:
+            with self._usb_lock:
+                # split large vectors into multiple parts
+                while len(value) > USB_FRAME_SIZE:
+                    logger.debug("Split writevector in parts")
+                    self._handle.write(value[0:USB_FRAME_SIZE])
+                    value = value[USB_FRAME_SIZE:]
+
+                self._handle.write(value)
         except AttributeError:
             logger.error('Nexys Write Error')
+            return False
+
+        return True
+
+    @contextmanager
+    def transaction(self):
+        """
+        Collect all writes to the same device and send them at the end of the with block
+
+        Writes from other instances with the same handle, i.e. Voltageboard, are collected too.
+        Register reads send collected writes first. Nested transactions join the outer one.
+        On exceptions collected writes are discarded.
+
+        Example:
+            with nexys.transaction():
+                nexys.write_register(0x09, 0x55, True)
+                vboard.update_vb()
+
+        :returns: Transaction
+        """
+
+        open_transactions = self.__open_transactions()
+        key = id(self._handle)
+
+        if key in open_transactions:
+            yield open_transactions[key]
+            return
+
+        transaction = Transaction(self)
+        open_transactions[key] = transaction
+
+        try:
+            yield transaction
+        finally:
+            del open_transactions[key]
+
+        transaction.commit()
+
+    def __open_transactions(self) -> dict:
+        """Get open transactions of current thread"""
+
+        if not hasattr(self._transactions, 'open'):
+            self._transactions.open = {}
+
+        return self._transactions.open
+
+    def __get_transaction(self) -> Transaction:
+        """Get open transaction for this device or None"""
+
+        return self.__open_transactions().get(id(self._handle))
+
+    def __send_transaction(self) -> None:
+        """Send writes collected so far, the transaction stays open"""
+
+        transaction = self.__get_transaction()
+
+        if transaction is not None:
+            transaction.commit()
 
     def read(self, num: int) -> bytes:
         """
@@ -160,12 +406,13 @@ class Nexysio(Spi):
         bytes = bytearray()
 
         try:
-            while remaining > 0:
-                rbytes = self._handle.read(remaining)
-                logger.info("Reading %d bytes from FTDI", remaining)
-                bytes.extend(rbytes)
-                logger.info("Read %d bytes from FTDI", len(rbytes))
-                remaining -= len(rbytes)
+            with self._usb_lock:
+                while remaining > 0:
+                    rbytes = self._handle.read(remaining)
+                    logger.info("Reading %d bytes from FTDI", remaining)
+                    bytes.extend(rbytes)
+                    logger.info("Read %d bytes from FTDI", len(rbytes))
+                    remaining -= len(rbytes)
 
             return bytes
 
@@ -176,11 +423,15 @@ class Nexysio(Spi):
     def close(self) -> None:
         """Close connection"""
 
+        self._register_caches.pop(id(self._handle), None)
         self._handle.close()
 
     def __setup(self) -> None:
         """Set FTDI USB connection settings"""
 
+        self.invalidate_register_cache()
+        self.invalidate_written_configs()
+
         self._handle.setTimeouts(1000, 1000)  # Timeout RX,TX
         self._handle.setBitMode(0xFF, 0x00)  # Reset
         self._handle.setBitMode(0xFF, 0x40)  # Set Synchronous 245 FIFO Mode
@@ -202,8 +453,19 @@ class Nexysio(Spi):
 
         data = [WRITE_ADRESS, register, 0x00, 0x01, value]
 
-        if flush:
+        if flush and register in UNCACHED_REGISTERS:
             self.write(bytes(data))
+        elif flush:
+            cached = value & ~VOLATILE_BITS.get(register, 0)
+            transaction = self.__get_transaction()
+
+            if transaction is not None:
+                # Cache is updated when the transaction is sent, dropped if it is discarded
+                transaction.append(bytes(data))
+                transaction.registers[register] = cached
+                transaction.after_commit(lambda: self.__register_cache().__setitem__(register, cached))
+            elif self.write_direct(bytes(data)):
+                self.__register_cache()[register] = cached
 
         return bytes(data)
 
@@ -246,13 +508,294 @@ class Nexysio(Spi):
         hbyte = num >> 8
         lbyte = num % 256
 
-        self.write(bytes([READ_ADRESS, register, hbyte, lbyte]))
-        answer = self.read(num)
+        # Keep order of collected writes and read
+        self.__send_transaction()
+
+        with self._usb_lock:
+            self.write_direct(bytes([READ_ADRESS, register, hbyte, lbyte]))
+            answer = self.read(num)
 
         logger.debug("Read Register %d Value 0x%s", register, answer.hex())
 
         return answer
 
+    def read_register_batch(self, registers: list) -> list:
+        """
+        Read multiple registers in one USB transaction
+
+        All read commands are written at once and the combined answer is read at once.
+
+        :param registers: List of registers or (register, number of bytes) tuples
+
+        :returns: List with one bytestring per register
+        """
+
+        registers = [(reg, 1) if isinstance(reg, int) else reg for reg in registers]
+
+        commands = bytearray()
+        for register, num in registers:
+            commands.extend([READ_ADRESS, register, num >> 8, num % 256])
+
+        # Keep order of collected writes and read
+        self.__send_transaction()
+
+        with self._usb_lock:
+            self.write_direct(bytes(commands))
+            answer = self.read(sum(num for _, num in registers))
+
+        values = []
+        offset = 0
+
+        for register, num in registers:
+            values.append(bytes(answer[offset:offset + num]))
+            offset += num
+
+            logger.debug("Read Register %d Value 0x%s", register, values[-1].hex())
+
+        return values
+
+    def set_register_bit(self, register: int, bit: int) -> None:
+        """
+        Set bit in register, read-modify-write against the shadow cache
+
+        :param register: FTDI Register
+        :param bit: Bit number
+        """
+        with self._usb_lock:
+            value = self.set_bit(self.__cached_value(register), bit)
+            self.write_register(register, value, True)
+
+    def clear_register_bit(self, register: int, bit: int) -> None:
+        """
+        Clear bit in register, read-modify-write against the shadow cache
+
+        :param register: FTDI Register
+        :param bit: Bit number
+        """
+        with self._usb_lock:
+            value = self.clear_bit(self.__cached_value(register), bit)
+            self.write_register(register, value, True)
+
+    def invalidate_register_cache(self, register: int = None) -> None:
+        """
+        Drop shadow cache of this device, i.e. after FPGA reset or reprogramming
+
+        :param register: FTDI Register, None drops all registers
+        """
+
+        if register is None:
+            self.__register_cache().clear()
+        else:
+            self.__register_cache().pop(register, None)
+
+    def __register_cache(self) -> dict:
+        """Get shadow cache of this device"""
+
+        return self._register_caches.setdefault(id(self._handle), {})
+
+    def __cached_value(self, register: int) -> int:
+        """
+        Get writable bits of register, read from hardware on first access
+
+        Values written in the open transaction are used before the shadow cache.
+        Uncached registers are read from hardware every time.
+
+        :param register: FTDI Register
+
+        :returns: Register value without volatile bits
+        """
+
+        if register in UNCACHED_REGISTERS:
+            return int.from_bytes(self.read_register(register), 'big') & ~VOLATILE_BITS.get(register, 0)
+
+        transaction = self.__get_transaction()
+
+        if transaction is not None and register in transaction.registers:
+            return transaction.registers[register]
+
+        cache = self.__register_cache()
+
+        if register not in cache:
+            value = int.from_bytes(self.read_register(register), 'big')
+            cache[register] = value & ~VOLATILE_BITS.get(register, 0)
+
+        return cache[register]
+
+    @staticmethod
+    def config_digest(value) -> bytes:
+        """
+        Digest of a configuration vector
+
+        :param value: BitArray or bytestring
+
+        :returns: Digest
+        """
+
+        if hasattr(value, 'tobytes'):
+            value = value.tobytes() + len(value).to_bytes(4, 'big')
+
+        return hashlib.blake2b(bytes(value), digest_size=16).digest()
+
+    def config_changed(self, name: str, digest: bytes, force: bool = False) -> bool:
+        """
+        Check if a configuration differs from the last written one, unchanged configurations are counted as skipped
+
+        Changed configurations are forgotten until config_written() is called after a successful write.
+
+        :param name: Name of the configuration
+        :param digest: Digest of the configuration, see config_digest()
+        :param force: Report configuration as changed
+
+        :returns: True if the configuration has to be written
+        """
+
+        if force or self._written_configs.get(name) != digest:
+            self._written_configs.pop(name, None)
+            return True
+
+        self._config_skips += 1
+        logger.debug("Skip write of unchanged %s config", name)
+
+        return False
+
+    def config_written(self, name: str, digest: bytes) -> None:
+        """
+        Remember digest of a written configuration, inside a transaction after it was sent
+
+        :param name: Name of the configuration
+        :param digest: Digest of the configuration, see config_digest()
+        """
+
+        def remember():
+            self._written_configs[name] = digest
+            self._config_writes += 1
+
+        transaction = self.__get_transaction()
+
+        if transaction is not None:
+            # Forget the old state, until the transaction is sent
+            self._written_configs.pop(name, None)
+            transaction.after_commit(remember)
+        else:
+            remember()
+
+    def invalidate_written_configs(self, name: str = None) -> None:
+        """
+        Forget written configurations, i.e. after power cycling a board
+
+        :param name: Name of the configuration, None forgets all
+        """
+
+        if name is None:
+            self._written_configs.clear()
+        else:
+            self._written_configs.pop(name, None)
+
+    @property
+    def config_write_stats(self) -> dict:
+        """Get statistics of configuration writes
+
+        written: Number of configurations written
+        skipped: Number of unchanged configurations not written
+
+        :returns: Dict with write statistics
+        """
+        return {'written': self._config_writes, 'skipped': self._config_skips}
+
+    def start_readout_thread(self, buffersize: int = 1 << 26, max_reads: int = 16,
+                             interval: float = 0.001) -> None:
+        """
+        Start background thread, which drains the SPI read FIFO into a ring buffer
+
+        Get data with read_readout_buffer()
+
+        :param buffersize: Ring buffer size in bytes
+        :param max_reads: Max. 4096 byte reads per FIFO poll
+        :param interval: Sleep time in s, if the FIFO is empty
+        """
+
+        if self._readout_thread is not None:
+            logger.warning("Readout thread already running")
+            return
+
+        self._readout_buffer = RingBuffer(buffersize)
+        self._readout_stop.clear()
+        self._readout_error = None
+
+        self._readout_thread = threading.Thread(target=self.__readout_loop, args=(max_reads, interval),
+                                                name="NexysReadout", daemon=True)
+        self._readout_thread.start()
+
+        logger.info("Readout thread started")
+
+    def stop_readout_thread(self) -> None:
+        """Stop background readout thread, buffered data can still be read"""
+
+        thread = self._readout_thread
+
+        if thread is None:
+            return
+
+        self._readout_stop.set()
+        thread.join()
+        self._readout_thread = None
+
+        logger.info("Readout thread stopped: %s", self._readout_buffer.stats)
+
+    def read_readout_buffer(self, num: int = None) -> bytes:
+        """
+        Read data collected by the readout thread
+
+        :param num: Max. number of bytes, None reads all available bytes
+
+        :returns: SPI read stream
+        """
+
+        if self._readout_buffer is None:
+            return b''
+
+        return self._readout_buffer.read(num)
+
+    @property
+    def readout_stats(self) -> dict:
+        """Ring buffer statistics of the readout thread, see RingBuffer.stats
+
+        running: True if the readout thread is running
+        error: Error which stopped the readout thread, None if it did not fail
+        """
+
+        if self._readout_buffer is None:
+            return {}
+
+        return dict(self._readout_buffer.stats, running=self._readout_thread is not None, error=self._readout_error)
+
+    def __readout_loop(self, max_reads: int, interval: float) -> None:
+        """
+        Readout thread loop
+
+        :param max_reads: Max. 4096 byte reads per FIFO poll
+        :param interval: Sleep time in s, if the FIFO is empty
+        """
+
+        while not self._readout_stop.is_set():
+            try:
+                readout = self.read_spi_fifo(max_reads)
+            except Exception as exc:
+                logger.error("Readout thread stopped: %s", exc)
+
+                # Allow restart, buffered data can still be read
+                self._readout_error = exc
+                self._readout_thread = None
+                break
+
+            if readout:
+                written = self._readout_buffer.write(readout)
+
+                if written < len(readout):
+                    logger.warning("Readout buffer overflow, dropped %d bytes", len(readout) - written)
+            else:
+                self._readout_stop.wait(interval)
+
     def gen_gecco_pattern(self, address: int, value: bytearray, clkdiv: int = 16) -> bytes:
         """
         Generate GECCO SR write pattern from bitvector
@@ -274,35 +817,33 @@ class Nexysio(Spi):
 
         self.debug_print("GECCO Config", length, hbyte, lbyte, header, value)
 
-        data = bytearray()
-
         # data
-        for bit in value:
-            pattern = SIN_GECCO if bit == 1 else 0
+        data = self.gen_waveform(value, SIN_GECCO, GECCO_CLOCKS, clkdiv)
 
-            data.extend([pattern, pattern | 1, pattern])
+        load = bytearray()
 
         # Load signal
-        data.extend([LD_GECCO, 0x00])
+        load.extend([LD_GECCO, 0x00])
 
         # Add 8 clocks
-        data.extend([0x01, 0x00] * 8)
+        load.extend([0x01, 0x00] * 8)
 
-        data.extend([LD_GECCO, 0x00])
+        load.extend([LD_GECCO, 0x00])
 
-        data = self.__addbytes(data, clkdiv)
+        data.extend(self.__addbytes(load, clkdiv))
 
         # concatenate header+dataasic
         return b''.join([header, data])
 
     def gen_asic_pattern_part(self, value: bytearray, wload: bool,
-                              clkdiv: int = 8, readback_mode=False) -> bytes:
+                              clkdiv: int = 8, readback_mode=False, waveform: np.ndarray = None) -> bytes:
         """
         Generate ASIC SR write pattern from bitvector
 
         :param value: Bytearray vector
         :param wload: Send load signal
         :param clkdiv: Clockdivider 0-65535
+        :param waveform: Precomputed waveform with one row per bit of value, see waveform_table()
 
         :returns: Bytearray with ASIC configvector Header+Data
         """
@@ -323,32 +864,58 @@ class Nexysio(Spi):
 
         self.debug_print("ASIC Config", length, hbyte, lbyte, header, value)
 
-        data, load = bytearray(), bytearray()
+        load = bytearray()
 
         if not readback_mode:
-            # data
-            for bit in value:
-                pattern = SIN_ASIC if bit == 1 else 0
-
-                data.extend([pattern, pattern | 1, pattern, pattern | 2, pattern])  # Generate double clocked pattern
+            # data, generate double clocked pattern
+            if waveform is not None:
+                data = bytearray(waveform.tobytes())
+            else:
+                data = self.gen_waveform(value, SIN_ASIC, ASIC_CLOCKS, clkdiv)
 
             # Load signal
             if wload:
                 load.extend([0x00, LD_ASIC, 0x00])
 
-            data = self.__addbytes(data, clkdiv)
             data.extend(self.__addbytes(load, clkdiv * 10))
 
         else:
-            data.extend([4 | 32, 4 | 33, 4 | 32, 4 | 34, 4 | 32])
-            for bit in value:
-                # data.extend([4 | 32, 4 | 33, 4, 4 | 2, 4])
-                data.extend([4, 4 | 1, 4, 4 | 2, 4])
-            data = self.__addbytes(data, clkdiv)
+            data = self.__addbytes(bytearray([4 | 32, 4 | 33, 4 | 32, 4 | 34, 4 | 32]), clkdiv)
+            # data.extend([4 | 32, 4 | 33, 4, 4 | 2, 4]) per bit
+            data.extend(self.gen_waveform(value, 0, READBACK_CLOCKS, clkdiv))
 
         # concatenate header+data
         return b''.join([header, data])
 
+    def gen_tdac_patterns(self, bits: np.ndarray, wload: bool, clkdiv: int = 8) -> np.ndarray:
+        """
+        Generate TDAC SR write patterns for multiple rows at once
+
+        Every row is identical to gen_tdac_pattern() of the row bitvector, including the header.
+
+        :param bits: Array with one row bitvector per row, one uint8 per bit
+        :param wload: Send load signal after each row
+        :param clkdiv: Clockdivider 0-65535
+
+        :returns: Array with one pattern per row
+        """
+
+        bits = np.asarray(bits, dtype=np.uint8)
+        nrows, nbits = bits.shape
+
+        length = (nbits * 5 + 30) * clkdiv
+        header = np.array([WRITE_ADRESS, SR_ASIC_ADRESS, length >> 8, length % 256], dtype=np.uint8)
+
+        data = waveform_table(SIN_ASIC, ASIC_CLOCKS, clkdiv)[bits].reshape(nrows, -1)
+
+        parts = [np.broadcast_to(header, (nrows, len(header))), data]
+
+        if wload:
+            load = np.frombuffer(self.__addbytes(bytearray([0x00, LD_TDAC_ASIC, 0x00]), clkdiv * 10), dtype=np.uint8)
+            parts.append(np.broadcast_to(load, (nrows, len(load))))
+
+        return np.hstack(parts)
+
     def gen_tdac_pattern(self, value: bytearray, wload: bool,
                          clkdiv: int = 8, readback_mode=False) -> bytes:
         """
@@ -380,17 +947,13 @@ class Nexysio(Spi):
         data, load = bytearray(), bytearray()
 
         if not readback_mode:
-            # data
-            for bit in value:
-                pattern = SIN_ASIC if bit == 1 else 0
-
-                data.extend([pattern, pattern | 1, pattern, pattern | 2, pattern])  # Generate double clocked pattern
+            # data, generate double clocked pattern
+            data = self.gen_waveform(value, SIN_ASIC, ASIC_CLOCKS, clkdiv)
 
             # Load signal
             if wload:
                 load.extend([0x00, LD_TDAC_ASIC, 0x00])
 
-            data = self.__addbytes(data, clkdiv)
             data.extend(self.__addbytes(load, clkdiv * 10))
 
         """else:
@@ -404,13 +967,14 @@ class Nexysio(Spi):
         return b''.join([header, data])
 
     def gen_asic_pattern(self, value: bytearray, wload: bool, clkdiv: int = 8,
-                         readback_mode=False) -> list:
+                         readback_mode=False, waveform: np.ndarray = None) -> list:
         """
         Split asic data in parts
 
         :param value: Bytearray vector
         :param wload: Send load signal
         :param clkdiv: Clockdivider 0-65535
+        :param waveform: Precomputed waveform with one row per bit of value, see waveform_table()
 
         :returns: List of Bytearrays with ASIC configvector Header+Data
         """
@@ -427,11 +991,14 @@ class Nexysio(Spi):
         length = len(value)
 
         while length >= max_value:
-            data.append(self.gen_asic_pattern_part(value[:max_value], False, clkdiv, readback_mode))
+            data.append(self.gen_asic_pattern_part(value[:max_value], False, clkdiv, readback_mode,
+                                                   None if waveform is None else waveform[:max_value]))
             value = value[max_value + 1:]
+            if waveform is not None:
+                waveform = waveform[max_value + 1:]
             length -= max_value
         else:
-            data.append(self.gen_asic_pattern_part(value, wload, clkdiv, readback_mode))
+            data.append(self.gen_asic_pattern_part(value, wload, clkdiv, readback_mode, waveform))
 
         return data
 
@@ -450,9 +1017,7 @@ class Nexysio(Spi):
         res_n is connected to FTDI Reg: 0 Bit: 4
         """
         # Set Reset bits 1
-        configregister = self.set_bit(self.get_configregister(), 4)
-        self.write_register(0, configregister, True)
+        self.set_register_bit(0, 4)
         time.sleep(.1)
         # Set Reset bits and readback bit 0
-        configregister = self.clear_bit(self.get_configregister(), 4)
-        self.write_register(0, configregister, True)
+        self.clear_register_bit(0, 4)
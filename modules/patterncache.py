@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 16:02:31 2026
+
+LRU cache for generated USB patterns
+"""
+from collections import OrderedDict
+
+
+class PatternCache:
+    """Least recently used cache for generated USB patterns
+
+    Memory is bounded by the number of entries and the total size of the cached patterns.
+    Cached patterns are stored as immutable tuples of bytestrings.
+    """
+
+    def __init__(self, maxentries: int = 256, maxbytes: int = 1 << 25) -> None:
+        """Init
+
+        :param maxentries: Max. number of cached patterns
+        :param maxbytes: Max. total size of cached patterns in bytes
+        """
+
+        self._maxentries = maxentries
+        self._maxbytes = maxbytes
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    @property
+    def nbytes(self) -> int:
+        """Total size of cached patterns in bytes"""
+        return self._bytes
+
+    @property
+    def stats(self) -> dict:
+        """Get cache statistics
+
+        hits: Number of lookups served from the cache
+        misses: Number of lookups not found in the cache
+        evictions: Number of patterns dropped to stay within the limits
+        entries: Number of cached patterns
+        bytes: Total size of cached patterns
+
+        :returns: Dict with cache statistics
+        """
+        return {
+            'hits': self._hits, 'misses': self._misses, 'evictions': self._evictions,
+            'entries': len(self._entries), 'bytes': self._bytes
+        }
+
+    def get(self, key) -> tuple:
+        """
+        Lookup pattern and mark it as recently used
+
+        :param key: Hashable cache key
+
+        :returns: Tuple of bytestrings or None if not cached
+        """
+
+        try:
+            parts = self._entries[key]
+        except KeyError:
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+
+        return parts
+
+    def put(self, key, parts) -> tuple:
+        """
+        Add pattern, least recently used patterns are evicted if limits are exceeded
+
+        Patterns larger than maxbytes are not cached.
+
+        :param key: Hashable cache key
+        :param parts: Bytestring or list of bytestrings
+
+        :returns: Cached tuple of bytestrings
+        """
+
+        if isinstance(parts, (bytes, bytearray)):
+            parts = (parts,)
+
+        parts = tuple(bytes(part) for part in parts)
+        size = sum(len(part) for part in parts)
+
+        if key in self._entries:
+            self._bytes -= sum(len(part) for part in self._entries.pop(key))
+
+        if size > self._maxbytes:
+            return parts
+
+        while self._entries and (len(self._entries) >= self._maxentries or self._bytes + size > self._maxbytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= sum(len(part) for part in evicted)
+            self._evictions += 1
+
+        self._entries[key] = parts
+        self._bytes += size
+
+        return parts
+
+    def clear(self) -> None:
+        """Drop all cached patterns, statistics are kept"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def reset_stats(self) -> None:
+        """Reset hit/miss statistics"""
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
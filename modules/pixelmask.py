@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 17:34:12 2026
+
+Pixel mask matrix for ASIC recconfig column words
+"""
+import logging
+
+import numpy as np
+
+from modules.setup_logger import logger
+
+
+logger = logging.getLogger(__name__)
+
+# Bits of a recconfig column word
+INJ_ROW_BIT = 0         # Injection switch of row <col number>
+PIXEL_BIT_OFFSET = 1    # Comparator disable bit of row 0, row n is at bit n + 1
+INJ_COL_BIT = 36        # Injection switch of this col
+AMPOUT_BIT = 37         # Analog output of this col
+
+
+class PixelMask:
+    """Boolean (cols x rows) matrix of enabled pixel comparators
+
+    Injection and ampout switches are kept as boolean vectors. Bits of the column words,
+    which are not covered by the matrix, are kept unchanged.
+    All set/get methods accept ints, slices or index arrays for cols and rows.
+    """
+
+    def __init__(self, num_cols: int = 35, num_rows: int = 35) -> None:
+        """Init with all pixels and switches disabled
+
+        :param num_cols: Number of columns
+        :param num_rows: Number of rows
+        """
+
+        self._num_cols = num_cols
+        self._num_rows = num_rows
+
+        self._enabled = np.zeros((num_cols, num_rows), dtype=bool)
+        self._inj_rows = np.zeros(num_rows, dtype=bool)
+        self._inj_cols = np.zeros(num_cols, dtype=bool)
+        self._ampout_cols = np.zeros(num_cols, dtype=bool)
+
+        # Column word bits not covered by the mask
+        self._other = np.zeros(num_cols, dtype=np.uint64)
+
+        self._pixel_weights = np.uint64(1) << np.arange(PIXEL_BIT_OFFSET, PIXEL_BIT_OFFSET + num_rows, dtype=np.uint64)
+
+    @classmethod
+    def from_words(cls, words, num_rows: int = 35):
+        """
+        Unpack recconfig column words
+
+        :param words: Column words ordered by col number
+        :param num_rows: Number of rows
+
+        :returns: PixelMask
+        """
+
+        words = np.array([int(word) for word in words], dtype=np.uint64)
+
+        mask = cls(len(words), num_rows)
+
+        mask._enabled[:] = (words[:, np.newaxis] & mask._pixel_weights) == 0
+        mask._inj_cols[:] = (words >> np.uint64(INJ_COL_BIT)) & np.uint64(1)
+        mask._ampout_cols[:] = (words >> np.uint64(AMPOUT_BIT)) & np.uint64(1)
+
+        nrows = min(len(words), num_rows)
+        mask._inj_rows[:nrows] = (words[:nrows] >> np.uint64(INJ_ROW_BIT)) & np.uint64(1)
+
+        mask._other = words & ~mask.__known_bits()
+
+        return mask
+
+    @classmethod
+    def from_recconfig(cls, recconfig: dict, num_rows: int = 35):
+        """
+        Unpack recconfig dict with entries col<n>: [width, word]
+
+        :param recconfig: recconfig dict of the ASIC config
+        :param num_rows: Number of rows
+
+        :returns: PixelMask
+        """
+        return cls.from_words([recconfig[f'col{col}'][1] for col in range(len(recconfig))], num_rows)
+
+    @property
+    def shape(self) -> tuple:
+        """(cols, rows)"""
+        return self._enabled.shape
+
+    @property
+    def enabled(self) -> np.ndarray:
+        """Read-only boolean (cols x rows) matrix of enabled comparators"""
+        enabled = self._enabled.view()
+        enabled.flags.writeable = False
+        return enabled
+
+    @property
+    def num_enabled(self) -> int:
+        """Number of enabled pixels"""
+        return int(np.count_nonzero(self._enabled))
+
+    def __known_bits(self) -> np.ndarray:
+        """Column word bits covered by the mask per col"""
+
+        bits = np.full(self._num_cols, np.bitwise_or.reduce(self._pixel_weights, initial=np.uint64(0)), dtype=np.uint64)
+        bits |= (np.uint64(1) << np.uint64(INJ_COL_BIT)) | (np.uint64(1) << np.uint64(AMPOUT_BIT))
+
+        # Row injection switches exist in the first <rows> cols only
+        bits[:min(self._num_cols, self._num_rows)] |= np.uint64(1) << np.uint64(INJ_ROW_BIT)
+
+        return bits
+
+    def set_pixels(self, cols, rows, enable: bool = True) -> None:
+        """
+        Enable or disable pixel comparators, cols and rows are broadcast against each other
+
+        Example:
+            mask.set_pixels([0, 3, 5], [10, 10, 12])    # Three pixels
+            mask.set_pixels(4, slice(None), False)      # Whole col
+
+        :param cols: Col numbers
+        :param rows: Row numbers
+        :param enable: True to enable, False to disable
+        """
+        self._enabled[cols, rows] = enable
+
+    def get_pixels(self, cols, rows) -> np.ndarray:
+        """
+        Check if pixels are enabled
+
+        :param cols: Col numbers
+        :param rows: Row numbers
+
+        :returns: Boolean array
+        """
+        return self._enabled[cols, rows]
+
+    def set_all(self, enable: bool = True) -> None:
+        """
+        Enable or disable all pixel comparators
+
+        :param enable: True to enable, False to disable
+        """
+        self._enabled[:] = enable
+
+    def apply_mask(self, pixels: np.ndarray) -> int:
+        """
+        Disable all pixels set in a boolean (cols x rows) matrix, i.e. noisy pixels
+
+        :param pixels: Boolean matrix with pixels to disable
+
+        :returns: Number of newly disabled pixels
+        """
+
+        pixels = np.asarray(pixels, dtype=bool)
+
+        if pixels.shape != self._enabled.shape:
+            logger.error("Mask shape %s does not match %s", pixels.shape, self._enabled.shape)
+            raise ValueError("Mask shape mismatch")
+
+        newly = int(np.count_nonzero(self._enabled & pixels))
+        self._enabled &= ~pixels
+
+        return newly
+
+    def set_inj_rows(self, rows, enable: bool = True) -> None:
+        """
+        Enable or disable row injection switches
+
+        :param rows: Row numbers
+        :param enable: True to enable, False to disable
+        """
+        self._inj_rows[rows] = enable
+
+    def set_inj_cols(self, cols, enable: bool = True) -> None:
+        """
+        Enable or disable col injection switches
+
+        :param cols: Col numbers
+        :param enable: True to enable, False to disable
+        """
+        self._inj_cols[cols] = enable
+
+    def set_ampout_col(self, col: int = None) -> None:
+        """
+        Select col for analog mux and disable other cols
+
+        :param col: Col number, None disables all
+        """
+        self._ampout_cols[:] = False
+
+        if col is not None:
+            self._ampout_cols[col] = True
+
+    def to_words(self) -> np.ndarray:
+        """
+        Pack mask into recconfig column words
+
+        :returns: uint64 array with one word per col
+        """
+
+        words = self._other.copy()
+
+        words |= np.where(self._enabled, np.uint64(0), self._pixel_weights).sum(axis=1, dtype=np.uint64)
+        words |= self._inj_cols.astype(np.uint64) << np.uint64(INJ_COL_BIT)
+        words |= self._ampout_cols.astype(np.uint64) << np.uint64(AMPOUT_BIT)
+
+        nrows = min(self._num_cols, self._num_rows)
+        words[:nrows] |= self._inj_rows[:nrows].astype(np.uint64) << np.uint64(INJ_ROW_BIT)
+
+        return words
+
+    def to_recconfig(self, recconfig: dict) -> None:
+        """
+        Write column words into recconfig dict
+
+        :param recconfig: recconfig dict of the ASIC config
+        """
+        for col, word in enumerate(self.to_words()):
+            recconfig[f'col{col}'][1] = int(word)
+
+    def save(self, filename: str) -> None:
+        """
+        Save pixel matrix as .npy file
+
+        :param filename: Path of .npy file
+        """
+        np.save(filename, self._enabled, allow_pickle=False)
+
+    def load(self, filename: str) -> None:
+        """
+        Load pixel matrix from .npy file, switches are unchanged
+
+        :param filename: Path of .npy file
+        """
+
+        enabled = np.load(filename, allow_pickle=False)
+
+        if enabled.shape != self._enabled.shape:
+            logger.error("Mask %s has shape %s, expected %s", filename, enabled.shape, self._enabled.shape)
+            raise ValueError("Mask shape mismatch")
+
+        self._enabled[:] = enabled.astype(bool)
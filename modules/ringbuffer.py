@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+""""""
+"""
+Created on Thu Oct 15 11:20:48 2026
+
+Ring buffer for continuous readout
+"""
+import numpy as np
+
+
+class RingBuffer:
+    """Preallocated single producer, single consumer byte ring buffer
+
+    The producer only advances the write index and the consumer only the read index,
+    so one writing and one reading thread need no lock.
+    """
+
+    def __init__(self, size: int) -> None:
+        """Init
+
+        :param size: Buffer size in bytes
+        """
+
+        self._buffer = np.zeros(size, dtype=np.uint8)
+        self._size = size
+
+        # Total number of bytes written/read, buffer positions are modulo size
+        self._head = 0
+        self._tail = 0
+
+        self._high_water = 0
+        self._overflows = 0
+        self._dropped = 0
+
+    @property
+    def size(self) -> int:
+        """Buffer size in bytes"""
+        return self._size
+
+    @property
+    def available(self) -> int:
+        """Number of bytes ready to read"""
+        return self._head - self._tail
+
+    @property
+    def stats(self) -> dict:
+        """Get buffer statistics
+
+        written: Total bytes written
+        read: Total bytes read
+        high_water: Maximum fill level in bytes
+        overflows: Number of writes, which did not fit into the buffer
+        dropped: Number of bytes lost by overflows
+
+        :returns: Dict with buffer statistics
+        """
+        return {
+            'written': self._head, 'read': self._tail, 'high_water': self._high_water,
+            'overflows': self._overflows, 'dropped': self._dropped
+        }
+
+    def write(self, data: bytes) -> int:
+        """
+        Append data, data exceeding the free space is dropped
+
+        :param data: Bytes to write
+
+        :returns: Number of bytes written
+        """
+
+        data = np.frombuffer(data, dtype=np.uint8)
+
+        free = self._size - (self._head - self._tail)
+
+        if data.size > free:
+            self._overflows += 1
+            self._dropped += data.size - free
+            data = data[:free]
+
+        start = self._head % self._size
+        first = min(data.size, self._size - start)
+
+        self._buffer[start:start + first] = data[:first]
+        self._buffer[:data.size - first] = data[first:]
+
+        # Publish data after copy
+        self._head += data.size
+        self._high_water = max(self._high_water, self._head - self._tail)
+
+        return data.size
+
+    def read(self, num: int = None) -> bytes:
+        """
+        Read contiguous chunk
+
+        :param num: Max. number of bytes, None reads all available bytes
+
+        :returns: Bytestring
+        """
+
+        available = self._head - self._tail
+        num = available if num is None else min(num, available)
+
+        start = self._tail % self._size
+        first = min(num, self._size - start)
+
+        data = self._buffer[start:start + first].tobytes() + self._buffer[:num - first].tobytes()
+
+        self._tail += num
+
+        return data
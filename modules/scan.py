@@ -16,7 +16,7 @@ logger = logging.getLogger(__name__)
 class Scan(Asic, Nexysio):
 
     def __init__(self, handle=0) -> None:
-        self._handle = handle
+        super().__init__(handle)
 
     @staticmethod
     def inj_scan_old(asic, vboard, injboard, nexys, file, **kwargs):
@@ -257,7 +257,7 @@ class Scan(Asic, Nexysio):
                         logger.debug('%s', binascii.hexlify(readout))
 
                         # Decode
-                        list_hits = decode.hits_from_readoutstream(readout)
+                        list_hits = decode.hits_from_readoutstream(readout, packed=True)
                         decoded = decode.decode_astropix2_hits(list_hits)
                         decoded = decoded.assign(scan_row=row, scan_col=col,
                                                  run=count, step=step, vinj=inj.amplitude, vth=vboard.dacvalues[7])
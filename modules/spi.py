@@ -40,6 +40,9 @@ SPI_READ_FIFO_FULL   = 0b1 << 5
 SPI_READBACK_ENABLE  = 0b1 << 6
 SPI_MODULE_RESET     = 0b1 << 7
 
+# Lookup table to reverse the bitorder of each byte, use with bytes.translate()
+REVERSE_BITORDER_TABLE = bytes(int(f'{i:08b}'[::-1], 2) for i in range(256))
+
 logger = logging.getLogger(__name__)
 
 
@@ -78,6 +81,16 @@ class Spi:
     def get_sr_readback_config(self) -> int:
         return int.from_bytes(self.read_register(SPI_READBACK_REG_CONF), 'big')
 
+    def get_spi_configs(self) -> tuple[int, int]:
+        """
+        Read SPI config and SR readback config in one USB transaction
+
+        :returns: SPI config register, SR readback config register
+        """
+        spi_config, readback_config = self.read_register_batch([SPI_CONFIG_REG, SPI_READBACK_REG_CONF])
+
+        return int.from_bytes(spi_config, 'big'), int.from_bytes(readback_config, 'big')
+
     def asic_spi_vector(self, value: bytearray, load: bool, n_load: int = 10,
                         broadcast: bool = True, chipid: int = 0) -> bytearray:
         """
@@ -141,13 +154,11 @@ class Spi:
         Set SPI Reset bit to 0/1 active-low
         :param enable: Enable
         """
-        configregister = self.get_spi_config()
-
         # Set Reset bits 1
-        configregister = self.clear_bit(configregister, 7) if enable else self.set_bit(configregister, 7)
-
-        logger.debug('Configregister: %s', hex(configregister))
-        self.write_register(SPI_CONFIG_REG, configregister, True)
+        if enable:
+            self.clear_register_bit(SPI_CONFIG_REG, 7)
+        else:
+            self.set_register_bit(SPI_CONFIG_REG, 7)
 
     def spi_reset(self) -> None:
         """
@@ -169,17 +180,11 @@ class Spi:
 
         for bit in reset_bits:
 
-            configregister = self.get_spi_config()
-
             # Set Reset bits 1
-            configregister = self.set_bit(configregister, bit)
-            self.write_register(SPI_CONFIG_REG, configregister, True)
-
-            configregister = self.get_spi_config()
+            self.set_register_bit(SPI_CONFIG_REG, bit)
 
             # Set Reset bits and readback bit 0
-            configregister = self.clear_bit(configregister, bit)
-            self.write_register(SPI_CONFIG_REG, configregister, True)
+            self.clear_register_bit(SPI_CONFIG_REG, bit)
 
     def sr_readback_reset(self) -> None:
         """
@@ -192,17 +197,11 @@ class Spi:
 
         for bit in reset_bits:
 
-            configregister = self.get_sr_readback_config()
-
             # Set Reset bits 1
-            configregister = self.set_bit(configregister, bit)
-            self.write_register(SPI_READBACK_REG_CONF, configregister, True)
-
-            configregister = self.get_sr_readback_config()
+            self.set_register_bit(SPI_READBACK_REG_CONF, bit)
 
             # Set Reset bits and readback bit 0
-            configregister = self.clear_bit(configregister, bit)
-            self.write_register(SPI_READBACK_REG_CONF, configregister, True)
+            self.clear_register_bit(SPI_READBACK_REG_CONF, bit)
 
     def direct_write_spi(self, data: bytes) -> None:
         """
@@ -289,8 +288,7 @@ class Spi:
         """
 
         if not MSBfirst:
-            for index in range(len(data)):
-                data[index] = int(format(data[index], '08b')[::-1], 2)
+            data[:] = data.translate(REVERSE_BITORDER_TABLE)
 
         logger.debug('SPIdata: %s', data)
 
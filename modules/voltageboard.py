@@ -15,7 +15,7 @@ class Voltageboard(Nexysio):
 
     def __init__(self, handle, pos: int, dacvalues: tuple[int, list[float]]) -> None:
 
-        self._handle = handle
+        super().__init__(handle)
 
         self._pos = 0  # pos
         self._dacvalues = []  # dacvalues
@@ -110,16 +110,25 @@ class Voltageboard(Nexysio):
         if 1 <= pos <= 8:
             self._pos = pos
 
-    def update_vb(self) -> None:
-        """Update voltageboard"""
+    def update_vb(self, force: bool = False) -> None:
+        """Update voltageboard, skipped if the DAC values are unchanged since the last write
+
+        :param force: Write DAC values even if unchanged
+        """
 
         # Generate vector
         vdacbits = self.__vb_vector(self.pos, self.dacvalues)
 
+        digest = self.config_digest(vdacbits)
+
+        if not self.config_changed('vb', digest, force):
+            return
+
         # print(f'update_vb pos: {self.pos} value: {self.dacvalues}\n')
 
         # Generate pattern
         vbbits = self.gen_gecco_pattern(12, vdacbits, 8)
 
         # Write to nexys
-        self.write(vbbits)
+        if self.write(vbbits):
+            self.config_written('vb', digest)